@@ -1,110 +1,42 @@
-import httplib2
-import time
-import json
+from restconf import RestconfClient
+from flowspec import FlowSpec, FlowSync
+from stats import PortStatsCollector
+from policy import BalancePolicy, Path
 class OdlUtil:
 	url = ''
 	def __init__(self, host, port):
 		self.url = 'http://' + host + ':' + str(port)
-	def install_flow(self, container_name='default',username="admin", password="admin"):
-		http = httplib2.Http()
-		http.add_credentials(username, password)
-		headers = {'Accept': 'application/json'}
-		flow_name = 'flow_' + str(int(time.time()*1000))
+	def install_flow(self, username="admin", password="admin"):
+		client = RestconfClient(self.url, username, password)
+		sync = FlowSync(client)
 		
-		s1h2body1='{"flow": [{"id": "0","match": {"ethernet-match":'\
-            		'{"ethernet-type": {"type": "2048"}},'\
-					'"ipv4-source":"10.0.0.2/32","ipv4-destination": "10.0.0.1/32"},'\
-            		'"instructions": {"instruction": [{"order": "0",'\
-            		'"apply-actions": {"action": [{"output-action": {'\
-            		'"output-node-connector": "1"},"order": "0"}]}}]},'\
-            		'"priority": "101","cookie": "1","table_id": "0"}]}'
-		s1h3body1='{"flow": [{"id": "1","match": {"ethernet-match":'\
-            		'{"ethernet-type": {"type": "2048"}},'\
-					'"ipv4-source":"10.0.0.3/32","ipv4-destination": "10.0.0.1/32"},'\
-            		'"instructions": {"instruction": [{"order": "0",'\
-            		'"apply-actions": {"action": [{"output-action": {'\
-            		'"output-node-connector": "1"},"order": "0"}]}}]},'\
-            		'"priority": "101","cookie": "1","table_id": "0"}]}'
+		#s1、s3上h2/h3到h1的流表
+		s1h2 = FlowSpec(0, '10.0.0.2/32', '10.0.0.1/32', 1)
+		s1h3 = FlowSpec(1, '10.0.0.3/32', '10.0.0.1/32', 1)
+		s3_1 = FlowSpec(0, '10.0.0.3/32', '10.0.0.1/32', 1)
+		#s2上h2到h1的流表
+		h2s2 = FlowSpec(0, '10.0.0.2/32', '10.0.0.1/32', 1)
+		#h3到h1的两条候选路径：s2直接从1口到s1，或者从2口经s3到s1
+		h3s2direct = FlowSpec(1, '10.0.0.3/32', '10.0.0.1/32', 1)
+		h3s2detour = FlowSpec(1, '10.0.0.3/32', '10.0.0.1/32', 2)
 	
-		h2s2body1 ='{"flow": [{"id": "0","match": {"ethernet-match":'\
-               		'{"ethernet-type": {"type": "2048"}},'\
-					'"ipv4-source":"10.0.0.2/32","ipv4-destination": "10.0.0.1/32"},'\
-            		'"instructions": {"instruction": [{"order": "0",'\
-            		'"apply-actions": {"action": [{"output-action": {'\
-                	'"output-node-connector": "1"},"order": "0"}]}}]},'\
-            		'"priority": "101","cookie": "1","table_id": "0"}]}'
-		
-		h3s2body1 ='{"flow": [{"id": "1","match": {"ethernet-match":'\
-               		'{"ethernet-type": {"type": "2048"}},'\
-					'"ipv4-source":"10.0.0.3/32","ipv4-destination": "10.0.0.1/32"},'\
-            		'"instructions": {"instruction": [{"order": "0",'\
-                	'"apply-actions": {"action": [{"output-action": {'\
-                	'"output-node-connector": "1"},"order": "0"}]}}]},'\
-            		'"priority": "101","cookie": "1","table_id": "0"}]}'
-		mh3s2body1 ='{"flow": [{"id": "1","match": {"ethernet-match":'\
-               		'{"ethernet-type": {"type": "2048"}},'\
-					'"ipv4-source":"10.0.0.3/32","ipv4-destination": "10.0.0.1/32"},'\
-            		'"instructions": {"instruction": [{"order": "0",'\
-                	'"apply-actions": {"action": [{"output-action": {'\
-                	'"output-node-connector": "1"},"order": "0"}]}}]},'\
-            		'"priority": "100","cookie": "1","table_id": "0"}]}'
-		
-		h3s2body2 ='{"flow": [{"id": "2","match": {"ethernet-match":'\
-               		'{"ethernet-type": {"type": "2048"}},'\
-					'"ipv4-source":"10.0.0.3/32","ipv4-destination": "10.0.0.1/32"},'\
-            		'"instructions": {"instruction": [{"order": "0",'\
-                	'"apply-actions": {"action": [{"output-action": {'\
-                	'"output-node-connector": "2"},"order": "0"}]}}]},'\
-            		'"priority": "101","cookie": "1","table_id": "0"}]}'
-		mh3s2body2 ='{"flow": [{"id": "2","match": {"ethernet-match":'\
-               		'{"ethernet-type": {"type": "2048"}},'\
-					'"ipv4-source":"10.0.0.3/32","ipv4-destination": "10.0.0.1/32"},'\
-            		'"instructions": {"instruction": [{"order": "0",'\
-                	'"apply-actions": {"action": [{"output-action": {'\
-                	'"output-node-connector": "2"},"order": "0"}]}}]},'\
-            		'"priority": "100","cookie": "1","table_id": "0"}]}'
-		
-		s3_1='{"flow": [{"id": "0","match": {"ethernet-match":'\
-                '{"ethernet-type": {"type": "2048"}},'\
-			        '"ipv4-source":"10.0.0.3/32","ipv4-destination": "10.0.0.1/32"},'\
-                '"instructions": {"instruction": [{"order": "0",'\
-                '"apply-actions": {"action": [{"output-action": {'\
-                '"output-node-connector": "1"},"order": "0"}]}}]},'\
-                '"priority": "101","cookie": "1","table_id": "0"}]}'
-	
-		headers = {'Content-type': 'application/json'}
-		num=0
-	
-		#下发s1和s3的流表
-		response, content = http.request(uri='http://127.0.0.1:8181/restconf/config/opendaylight-inventory:nodes/node/openflow:1/flow-node-inventory:table/0/flow/0', body=s1h2body1, method='PUT',headers=headers)	
-		response, content = http.request(uri='http://127.0.0.1:8181/restconf/config/opendaylight-inventory:nodes/node/openflow:1/flow-node-inventory:table/0/flow/1', body=s1h3body1, method='PUT',headers=headers)
-		response, content = http.request(uri='http://127.0.0.1:8181/restconf/config/opendaylight-inventory:nodes/node/openflow:3/flow-node-inventory:table/0/flow/0', body=s3_1, method='PUT',headers=headers)
-		#s2调用h2到1的流表			
-		response, content = http.request(uri='http://127.0.0.1:8181/restconf/config/opendaylight-inventory:nodes/node/openflow:2/flow-node-inventory:table/0/flow/0', body=h2s2body1, method='PUT',headers=headers)
-		while num < 4 :
-			#获取s2端口1的流量
-			uri = 'http://127.0.0.1:8181/restconf/operational/opendaylight-inventory:nodes/node/openflow:2/node-connector/openflow:2:1'
-			response, content = http.request(uri=uri, method='GET')
-			content = json.loads(content)
-			statistics = content['node-connector'][0]['opendaylight-port-statistics:flow-capable-node-connector-statistics']
-			bytes1 = statistics['bytes']['transmitted']
-			#0.1秒后再次获取
-			time.sleep(0.1)
-			response, content = http.request(uri=uri, method='GET')
-			content = json.loads(content)
-			statistics = content['node-connector'][0]['opendaylight-port-statistics:flow-capable-node-connector-statistics']
-			bytes2 = statistics['bytes']['transmitted']
-			#在检测到s2的1口流量空闲时发的流表
-			speed = float(bytes2-bytes1)/1
-			if speed != 0 :#获取有效的速度
-				if speed < 1000 :
-					print('此时s2端口1空闲，h3数据包从往1口通过')
-					response, content = http.request(uri='http://127.0.0.1:8181/restconf/config/opendaylight-inventory:nodes/node/openflow:2/flow-node-inventory:table/0/flow/1', body=h3s2body1, method='PUT',headers=headers)
-					response, content = http.request(uri='http://127.0.0.1:8181/restconf/config/opendaylight-inventory:nodes/node/openflow:2/flow-node-inventory:table/0/flow/2', body=mh3s2body2, method='PUT',headers=headers)
-				#在检测到s2的1口流量满载时发的流表
-				else :
-					print('此时s2端口1满载，h3数据包改为往2口通过')
-					response, content = http.request(uri='http://127.0.0.1:8181/restconf/config/opendaylight-inventory:nodes/node/openflow:2/flow-node-inventory:table/0/flow/1', body=mh3s2body1, method='PUT',headers=headers)
-					response, content = http.request(uri='http://127.0.0.1:8181/restconf/config/opendaylight-inventory:nodes/node/openflow:2/flow-node-inventory:table/0/flow/2', body=h3s2body2, method='PUT',headers=headers)
+		#后台并发采集所有交换机所有端口的统计，每0.5秒一轮
+		collector = PortStatsCollector(client, interval=0.5).start()
+		#链路容量10Mbit/s，当前路径利用率超过80%且另一条路径低于50%时改道，两次改道至少间隔5秒
+		policy = BalancePolicy(collector, capacity=1250000, high=0.8, low=0.5,
+			hold=5.0)
+		policy.add_static('openflow:1', s1h2, s1h3)
+		policy.add_static('openflow:3', s3_1)
+		policy.add_static('openflow:2', h2s2)
+		policy.add_pair(('h3', 'h1'), [
+			Path('s2-s1', ['openflow:2:1'], {'openflow:2': [h3s2direct]}),
+			Path('s2-s3-s1', ['openflow:2:2', 'openflow:3:1'],
+				{'openflow:2': [h3s2detour]})])
+		while True :
+			#每轮采样后重新评估路径，只下发有变化的流表
+			for pair, old, new in policy.decide():
+				print('%s -> %s 的路径由 %s 改为 %s' % (pair[0], pair[1], old, new))
+			sync.apply(policy.desired())
+			collector.wait(timeout=2)
 odl = OdlUtil('127.0.0.1', '8181')
 odl.install_flow()
@@ -0,0 +1,178 @@
+#流表描述对象：按IPv4源/目的地址匹配并从指定端口转发，序列化结果只计算一次并缓存
+#FlowSync读取控制器config数据库，只对与期望状态不同的流表做PUT或DELETE，只删除带有自己cookie的流表；
+#刚读取（或重新读取）的表整表一次PUT，其它应用的流表原样保留在表里
+import json
+from concurrent.futures import wait
+
+
+class FlowSpec:
+
+	__slots__ = ('id', 'src', 'dst', 'out_port', 'priority', 'table_id',
+		'cookie', '_flow', '_body')
+
+	def __init__(self, flow_id, src, dst, out_port, priority=101, table_id=0,
+		cookie=1):
+		self.id = str(flow_id)
+		self.src = src
+		self.dst = dst
+		self.out_port = str(out_port)
+		self.priority = int(priority)
+		self.table_id = int(table_id)
+		self.cookie = int(cookie)
+		self._flow = None
+		self._body = None
+
+	def key(self):
+		return (self.id, self.src, self.dst, self.out_port, self.priority,
+			self.table_id, self.cookie)
+
+	def __eq__(self, other):
+		return isinstance(other, FlowSpec) and self.key() == other.key()
+
+	def __ne__(self, other):
+		return not self == other
+
+	def __hash__(self):
+		return hash(self.key())
+
+	def __repr__(self):
+		return 'FlowSpec(%s %s->%s out:%s pri:%d)' % (self.id, self.src,
+			self.dst, self.out_port, self.priority)
+
+	#RESTCONF中flow对象的结构
+	def flow(self):
+		if self._flow is None:
+			self._flow = {'id': self.id,
+				'match': {'ethernet-match': {'ethernet-type': {'type': 2048}},
+					'ipv4-source': self.src,
+					'ipv4-destination': self.dst},
+				'instructions': {'instruction': [{'order': 0,
+					'apply-actions': {'action': [{'order': 0,
+						'output-action': {
+							'output-node-connector': self.out_port}}]}}]},
+				'priority': self.priority,
+				'cookie': self.cookie,
+				'table_id': self.table_id}
+		return self._flow
+
+	#单条流表PUT的请求体
+	def body(self):
+		if self._body is None:
+			self._body = json.dumps({'flow': [self.flow()]})
+		return self._body
+
+	#从config数据库读出的flow对象还原，不是本模型能描述的流表返回None
+	@classmethod
+	def from_flow(cls, flow):
+		try:
+			match = flow['match']
+			action = flow['instructions']['instruction'][0]['apply-actions']['action'][0]
+			return cls(flow['id'], match['ipv4-source'],
+				match['ipv4-destination'],
+				action['output-action']['output-node-connector'],
+				flow.get('priority', 0), flow.get('table_id', 0),
+				flow.get('cookie', 0))
+		except (KeyError, IndexError, TypeError, ValueError):
+			return None
+
+
+class FlowSync:
+
+	def __init__(self, client, cookie=1):
+		self.client = client
+		#本程序下发的流表都带这个cookie，期望状态里没有的流表只在cookie相同时才删除，其它应用的流表不动
+		self.cookie = int(cookie)
+		#已知的config数据库状态：{(node, table_id): {flow_id: FlowSpec或None}}
+		self.known = {}
+		#config数据库中不属于本程序的流表原文：{(node, table_id): [flow, ...]}，整表PUT时原样写回
+		self.foreign = {}
+		#计数：单条PUT、整表PUT、DELETE以及因无变化而省掉的写请求数
+		self.stats = {'put': 0, 'table': 0, 'delete': 0, 'skipped': 0}
+
+	#读取一张表在config数据库中的流表
+	def load(self, node, table_id=0):
+		content = self.client.get(self.client.table_path(node, table_id))
+		flows = {}
+		foreign = []
+		if content:
+			for table in content.get('flow-node-inventory:table', []):
+				for flow in table.get('flow', []):
+					spec = FlowSpec.from_flow(flow)
+					flows[str(flow['id'])] = spec
+					if spec is None or spec.cookie != self.cookie:
+						foreign.append(flow)
+		self.known[(node, table_id)] = flows
+		self.foreign[(node, table_id)] = foreign
+		return flows
+
+	#把多个交换机的流表同步到期望状态：desired为 {node: [FlowSpec, ...]}
+	#没有读过的表先并发读取一次，与期望状态不同时整表PUT一次；之后直接与本地记录的状态比较，逐条PUT或DELETE
+	def apply(self, desired, table_id=0, refresh=False):
+		nodes = [node for node in desired
+			if refresh or (node, table_id) not in self.known]
+		if nodes:
+			wait([self.client.executor.submit(self.load, node, table_id)
+				for node in nodes])
+		jobs = []
+		for node, specs in desired.items():
+			current = self.known.setdefault((node, table_id), {})
+			want = dict((spec.id, spec) for spec in specs)
+			#已提交的PUT会在线程池里改写current，先在快照上算出要写和要删的流表再提交
+			snapshot = dict(current)
+			stale = [flow_id for flow_id, spec in snapshot.items()
+				if flow_id not in want and spec is not None
+				and spec.cookie == self.cookie]
+			if node in nodes:
+				if stale or any(snapshot.get(flow_id) != spec
+						for flow_id, spec in want.items()):
+					jobs.append(self.client.executor.submit(self._put_table,
+						node, list(want.values()), table_id))
+				else:
+					self.stats['skipped'] += 1
+				continue
+			for flow_id, spec in want.items():
+				if snapshot.get(flow_id) == spec:
+					self.stats['skipped'] += 1
+					continue
+				jobs.append(self.client.executor.submit(self._put, node,
+					spec, table_id))
+			for flow_id in stale:
+				jobs.append(self.client.executor.submit(self._delete, node,
+					flow_id, table_id))
+		wait(jobs)
+		return len(jobs)
+
+	def _put(self, node, spec, table_id):
+		response, content = self.client.put_flow(node, spec.id, spec.body(),
+			table_id)
+		if response.status in (200, 201, 204):
+			self.known.get((node, table_id), {})[spec.id] = spec
+		else:
+			#写入失败时下次重新读取数据库
+			self.known.pop((node, table_id), None)
+		self.stats['put'] += 1
+
+	#整表PUT：期望的流表加上表中其它应用的流表（与期望流表同id的以期望为准）
+	def _put_table(self, node, specs, table_id):
+		ids = set(spec.id for spec in specs)
+		foreign = [flow for flow in self.foreign.get((node, table_id), [])
+			if str(flow['id']) not in ids]
+		response, content = self.client.put_table(node,
+			[spec.flow() for spec in specs] + foreign, table_id)
+		if response.status in (200, 201, 204):
+			flows = dict((str(flow['id']), FlowSpec.from_flow(flow))
+				for flow in foreign)
+			flows.update((spec.id, spec) for spec in specs)
+			self.known[(node, table_id)] = flows
+			self.foreign[(node, table_id)] = foreign
+		else:
+			self.known.pop((node, table_id), None)
+		self.stats['table'] += 1
+
+	def _delete(self, node, flow_id, table_id):
+		response, content = self.client.delete_flow(node, flow_id, table_id)
+		if response.status in (200, 204, 404):
+			self.known.get((node, table_id), {}).pop(flow_id, None)
+		else:
+			self.known.pop((node, table_id), None)
+		self.stats['delete'] += 1
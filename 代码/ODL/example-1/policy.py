@@ -0,0 +1,91 @@
+#负载均衡策略：每个主机对可以有任意多条候选路径，按测得的链路利用率为主机对选择路径
+#当前路径利用率超过高水位、且目标路径低于低水位、且距上次切换超过最短保持时间才改道，避免来回抖动
+import time
+
+
+class Path:
+
+	__slots__ = ('name', 'links', 'flows')
+
+	def __init__(self, name, links, flows):
+		self.name = name
+		#路径经过的出端口（node-connector id），用来计算路径利用率
+		self.links = links
+		#选中该路径时需要下发的流表：{node: [FlowSpec, ...]}
+		self.flows = flows
+
+	def __repr__(self):
+		return 'Path(%s)' % self.name
+
+
+class BalancePolicy:
+
+	def __init__(self, collector, capacity, high=0.8, low=0.5, hold=5.0,
+		capacities=None):
+		self.collector = collector
+		#链路默认容量（字节/秒），以及个别链路的容量
+		self.capacity = capacity
+		self.capacities = capacities or {}
+		self.high = high
+		self.low = low
+		#两次改道之间的最短保持时间（秒）
+		self.hold = hold
+		self.static = {}
+		self.pairs = {}
+		self.assigned = {}
+		self.changed_at = {}
+
+	#与路径选择无关、一直需要下发的流表
+	def add_static(self, node, *flows):
+		self.static.setdefault(node, []).extend(flows)
+
+	def add_pair(self, pair, paths):
+		self.pairs[pair] = list(paths)
+
+	def link_util(self, link):
+		rate = self.collector.rate(link)
+		if rate is None:
+			return 0.0
+		return rate / float(self.capacities.get(link, self.capacity))
+
+	def path_util(self, path):
+		return max([self.link_util(link) for link in path.links] or [0.0])
+
+	#根据当前利用率调整各主机对的路径，返回 [(主机对, 旧路径, 新路径)]
+	def decide(self, now=None):
+		if now is None:
+			now = time.monotonic()
+		util = {}
+		for paths in self.pairs.values():
+			for path in paths:
+				util[path] = self.path_util(path)
+		changes = []
+		#每轮每条路径最多迁入一个主机对，避免所有主机对同时挤到同一条路径上
+		filled = set()
+		for pair, paths in self.pairs.items():
+			current = self.assigned.get(pair)
+			if current is None:
+				#第一次分配直接选利用率最低的路径
+				best = min(paths, key=lambda p: util[p])
+			else:
+				candidates = [p for p in paths
+					if p is not current and p not in filled]
+				if not candidates:
+					continue
+				best = min(candidates, key=lambda p: util[p])
+				if util[current] <= self.high or util[best] >= self.low or \
+					now - self.changed_at[pair] < self.hold:
+					continue
+			self.assigned[pair] = best
+			self.changed_at[pair] = now
+			filled.add(best)
+			changes.append((pair, current, best))
+		return changes
+
+	#当前路径分配对应的完整流表：{node: [FlowSpec, ...]}
+	def desired(self):
+		tables = dict((node, list(flows)) for node, flows in self.static.items())
+		for path in self.assigned.values():
+			for node, flows in path.flows.items():
+				tables.setdefault(node, []).extend(flows)
+		return tables
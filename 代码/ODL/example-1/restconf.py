@@ -0,0 +1,74 @@
+#RESTCONF客户端：保持长连接的httplib2连接池，可以一次PUT整张表的流表，不同交换机的请求通过线程池并发
+import json
+import queue
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import httplib2
+
+NODES = '/restconf/config/opendaylight-inventory:nodes/node/'
+INVENTORY = '/restconf/operational/opendaylight-inventory:nodes'
+OPERATIONAL = INVENTORY + '/node/'
+
+
+class RestconfClient:
+
+	def __init__(self, url, username='admin', password='admin', pool_size=8):
+		self.url = url
+		self.pool_size = pool_size
+		#每个httplib2.Http对象内部会复用与控制器的keep-alive连接，但不是线程安全的，所以放进池里轮流使用
+		self.pool = queue.Queue()
+		for i in range(pool_size):
+			http = httplib2.Http()
+			http.add_credentials(username, password)
+			self.pool.put(http)
+		self.executor = ThreadPoolExecutor(max_workers=pool_size)
+
+	def request(self, path, method='GET', body=None):
+		headers = {'Accept': 'application/json',
+			'Connection': 'keep-alive'}
+		if body is not None:
+			headers['Content-type'] = 'application/json'
+			if not isinstance(body, (str, bytes)):
+				body = json.dumps(body)
+		http = self.pool.get()
+		try:
+			return http.request(uri=self.url + path, method=method,
+				body=body, headers=headers)
+		finally:
+			self.pool.put(http)
+
+	def get(self, path):
+		response, content = self.request(path)
+		if response.status != 200:
+			return None
+		return json.loads(content)
+
+	def table_path(self, node, table_id=0):
+		return NODES + node + '/flow-node-inventory:table/' + str(table_id)
+
+	#单条流表的PUT/DELETE，body为 {'flow': [flow]} 或已经序列化好的请求体
+	def put_flow(self, node, flow_id, body, table_id=0):
+		path = self.table_path(node, table_id) + '/flow/' + str(flow_id)
+		return self.request(path, 'PUT', body)
+
+	def delete_flow(self, node, flow_id, table_id=0):
+		path = self.table_path(node, table_id) + '/flow/' + str(flow_id)
+		return self.request(path, 'DELETE')
+
+	#一次PUT替换整张表的流表列表
+	def put_table(self, node, flows, table_id=0):
+		body = {'flow-node-inventory:table': [{'id': table_id, 'flow': flows}]}
+		return self.request(self.table_path(node, table_id), 'PUT', body)
+
+	#GET并记下应答到达时的单调时钟时刻
+	def get_timed(self, path):
+		content = self.get(path)
+		return content, time.monotonic()
+
+	#并发执行多个GET，返回与paths顺序一致的 (结果, 应答时刻)
+	def get_many(self, paths):
+		return list(self.executor.map(self.get_timed, paths))
+
+	def close(self):
+		self.executor.shutdown()
@@ -0,0 +1,131 @@
+#端口统计采集：后台线程按固定周期并发读取所有交换机所有端口的统计
+#用单调时钟计算实际经过的时间得到速率，再做EWMA平滑，可以随时查询每个端口的速率与利用率
+import threading
+import time
+
+from restconf import INVENTORY, OPERATIONAL
+
+STATS_KEY = 'opendaylight-port-statistics:flow-capable-node-connector-statistics'
+
+
+class PortRate:
+
+	__slots__ = ('tx_bytes', 'rx_bytes', 'time', 'tx_rate', 'rx_rate')
+
+	def __init__(self, tx_bytes, rx_bytes, now):
+		self.tx_bytes = tx_bytes
+		self.rx_bytes = rx_bytes
+		self.time = now
+		#字节/秒，第二次采样之后才有值
+		self.tx_rate = None
+		self.rx_rate = None
+
+
+class PortStatsCollector:
+
+	def __init__(self, client, interval=1.0, alpha=0.3, nodes=None,
+		capacity=None):
+		self.client = client
+		self.interval = interval
+		#EWMA系数，越大越跟随最新的采样
+		self.alpha = alpha
+		#不指定时从operational数据库发现所有交换机
+		self.nodes = nodes
+		#端口容量（字节/秒），用于计算利用率
+		self.capacity = capacity
+		self.ports = {}
+		self.samples = 0
+		self.lock = threading.Lock()
+		self.updated = threading.Condition(self.lock)
+		self.thread = None
+		self.running = False
+
+	def start(self):
+		self.running = True
+		self.thread = threading.Thread(target=self._run)
+		self.thread.daemon = True
+		self.thread.start()
+		return self
+
+	def stop(self):
+		self.running = False
+
+	def _run(self):
+		while self.running:
+			begin = time.monotonic()
+			try:
+				self.poll()
+			except Exception as e:
+				print('port statistics poll failed: %s' % e)
+			time.sleep(max(self.interval - (time.monotonic() - begin), 0))
+
+	def discover(self):
+		content = self.client.get(INVENTORY)
+		if not content:
+			return []
+		return [node['id'] for node in content['nodes'].get('node', [])]
+
+	#并发读取所有交换机的端口统计并更新速率表
+	def poll(self):
+		nodes = self.nodes or self.discover()
+		#每个交换机的速率按它自己的GET应答到达时刻计算，不受其它交换机应答快慢的影响
+		results = self.client.get_many([OPERATIONAL + node for node in nodes])
+		for content, now in results:
+			if not content:
+				continue
+			for node in content.get('node', []):
+				for connector in node.get('node-connector', []):
+					statistics = connector.get(STATS_KEY)
+					if statistics:
+						self._update(connector['id'],
+							statistics['bytes']['transmitted'],
+							statistics['bytes']['received'], now)
+		with self.updated:
+			self.samples += 1
+			self.updated.notify_all()
+
+	def _update(self, port, tx_bytes, rx_bytes, now):
+		with self.lock:
+			old = self.ports.get(port)
+			new = PortRate(tx_bytes, rx_bytes, now)
+			self.ports[port] = new
+			if old is None or now <= old.time:
+				return
+			elapsed = now - old.time
+			for name, delta in (('tx_rate', tx_bytes - old.tx_bytes),
+				('rx_rate', rx_bytes - old.rx_bytes)):
+				#计数器被清零时丢弃这次采样
+				if delta < 0:
+					setattr(new, name, getattr(old, name))
+					continue
+				rate = delta / elapsed
+				last = getattr(old, name)
+				if last is not None:
+					rate = self.alpha * rate + (1 - self.alpha) * last
+				setattr(new, name, rate)
+
+	#等待下一轮采样完成，超时返回False
+	def wait(self, timeout=None):
+		with self.updated:
+			samples = self.samples
+			self.updated.wait_for(lambda: self.samples != samples, timeout)
+			return self.samples != samples
+
+	#查询端口的平滑速率（字节/秒），还没有速率时返回None
+	def rate(self, port, direction='tx'):
+		with self.lock:
+			entry = self.ports.get(port)
+			return None if entry is None else getattr(entry, direction + '_rate')
+
+	def utilization(self, port, direction='tx', capacity=None):
+		rate = self.rate(port, direction)
+		capacity = capacity or self.capacity
+		if rate is None or not capacity:
+			return None
+		return rate / float(capacity)
+
+	#返回 {port: (tx_rate, rx_rate)} 的快照
+	def table(self):
+		with self.lock:
+			return dict((port, (entry.tx_rate, entry.rx_rate))
+				for port, entry in self.ports.items())
@@ -1,17 +1,28 @@
-import os
 import time
+from flowprog import FlowProgrammer, flood_rules
+#边缘交换机e7-e10的流表（原inite.sh），始终保留
+base = dict(('e%d' % i, flood_rules([1, 2], [3, 4])) for i in range(7, 11))
+#两组路径：c1/a3/a5（原addt1.sh）与c2/a4/a6（原addt2.sh）
+team1 = {'c1': flood_rules([1, 2], [3, 4], down_to_down=False),
+	'a3': flood_rules([1, 2], [3, 4]),
+	'a5': flood_rules([1, 2], [3, 4])}
+team2 = {'c2': flood_rules([1, 2], [3, 4], down_to_down=False),
+	'a4': flood_rules([1, 2], [3, 4]),
+	'a6': flood_rules([1, 2], [3, 4])}
+prog = FlowProgrammer()
 def runteam1():
-	os.system("./addt1.sh")
+	#先装上第一组路径，成功后再清空第二组
+	prog.switch_over(team1, team2)
 	time.sleep(1)
-	os.system("./delt2.sh")
 	return 1;
 def runteam2():
-	os.system("./addt2.sh")
+	prog.switch_over(team2, team1)
 	time.sleep(1)
-	os.system("./delt1.sh")
 	return 1;
-os.system("./delflows.sh")
-os.system("./inite.sh")
+#初始状态：边缘交换机装好流表，两组路径都清空（原delflows.sh + inite.sh）
+init = dict(base)
+init.update(dict((switch, []) for switch in list(team1) + list(team2)))
+prog.apply(init)
 while(True):
 	runteam1()
 	runteam2()
@@ -14,12 +14,12 @@ from mininet.util import dumpNodeConnections
 class MyTopo( Topo ):
     "Simple topology example."
  
-    def __init__( self ):
+    def __init__( self, L1=2 ):
         "Create custom topo."
  
         # Initialize topology
+        # L1为核心交换机个数；标准k叉胖树见fattree.py
         Topo.__init__( self )
-        L1 = 2
         L2 = L1 * 2 
         L3 = L2
         c = []
@@ -61,4 +61,4 @@ class MyTopo( Topo ):
                     host = self.addHost( 'h{}'.format( count ) )
                     self.addLink( sw1, host )
                     count += 1
-topos = { 'mytopo': ( lambda: MyTopo() ) }
+topos = { 'mytopo': ( lambda L1=2: MyTopo( int( L1 ) ) ) }
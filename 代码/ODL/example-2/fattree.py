@@ -0,0 +1,120 @@
+#!/usr/bin/python
+#k叉胖树拓扑，以及与之配套的主动下发流表（两级前缀/后缀路由）
+"""k-ary fat-tree topology with proactive two-level routing tables.
+
+Use '--custom fattree.py --topo fattree,8' with mn, or run this file directly
+to start the network and program every switch without a controller:
+
+    sudo python fattree.py 8
+"""
+
+import sys
+
+from mininet.topo import Topo
+from mininet.net import Mininet
+from mininet.node import OVSSwitch
+from mininet.cli import CLI
+from mininet.log import setLogLevel
+
+from flowprog import FlowProgrammer
+
+
+class FatTreeTopo( Topo ):
+    "Standard k-ary fat-tree, k even."
+
+    def __init__( self, k=4 ):
+        "Create fat-tree."
+
+        Topo.__init__( self )
+        if k < 2 or k % 2:
+            raise ValueError( 'k must be a positive even number' )
+        self.k = k
+        half = k // 2
+        cores = half * half
+        self.core = []
+        self.agg = []
+        self.edge = []
+        self.hosts_ip = {}
+
+        #交换机沿用datacenter.py的命名：c1..，a..，e..，编号连续
+        for i in range( cores ):
+            self.core.append( self.addSwitch( 'c{}'.format( i + 1 ) ) )
+        for p in range( k ):
+            self.agg.append( [ self.addSwitch( 'a{}'.format(
+                cores + p * half + i + 1 ) ) for i in range( half ) ] )
+        for p in range( k ):
+            self.edge.append( [ self.addSwitch( 'e{}'.format(
+                cores + k * half + p * half + i + 1 ) ) for i in range( half ) ] )
+
+        #端口约定：边缘交换机1..k/2接主机、k/2+1..k接汇聚；汇聚交换机1..k/2接边缘、k/2+1..k接核心；
+        #核心交换机的端口p+1接第p个pod
+        count = 1
+        for p in range( k ):
+            for e in range( half ):
+                for j in range( half ):
+                    ip = '10.{}.{}.{}'.format( p, e, j + 2 )
+                    host = self.addHost( 'h{}'.format( count ), ip=ip + '/8' )
+                    self.hosts_ip[ host ] = ip
+                    self.addLink( self.edge[p][e], host, port1=j + 1 )
+                    count += 1
+                for a in range( half ):
+                    self.addLink( self.edge[p][e], self.agg[p][a],
+                                  port1=half + a + 1, port2=e + 1 )
+            for a in range( half ):
+                for c in range( half ):
+                    self.addLink( self.agg[p][a], self.core[a * half + c],
+                                  port1=half + c + 1, port2=p + 1 )
+
+
+#为胖树生成两级路由表：向下按目的前缀精确转发，向上按目的主机号（后缀）在上行端口间分散
+#返回 {交换机名: [ovs-ofctl流表, ...]}
+def fattree_flows( topo ):
+    k = topo.k
+    half = k // 2
+    tables = {}
+    for p in range( k ):
+        for e in range( half ):
+            flows = []
+            for j in range( half ):
+                flows.append( 'priority=200,ip,nw_dst=10.{}.{}.{},actions=output:{}'
+                              .format( p, e, j + 2, j + 1 ) )
+            for j in range( half ):
+                flows.append( 'priority=100,ip,nw_dst=0.0.0.{}/0.0.0.255,'
+                              'actions=output:{}'.format(
+                                  j + 2, half + ( j + e ) % half + 1 ) )
+            tables[ topo.edge[p][e] ] = flows
+        for a in range( half ):
+            flows = []
+            for e in range( half ):
+                flows.append( 'priority=200,ip,nw_dst=10.{}.{}.0/24,actions=output:{}'
+                              .format( p, e, e + 1 ) )
+            for j in range( half ):
+                flows.append( 'priority=100,ip,nw_dst=0.0.0.{}/0.0.0.255,'
+                              'actions=output:{}'.format(
+                                  j + 2, half + ( j + a ) % half + 1 ) )
+            tables[ topo.agg[p][a] ] = flows
+    for core in topo.core:
+        tables[ core ] = [ 'priority=200,ip,nw_dst=10.{}.0.0/16,actions=output:{}'
+                           .format( p, p + 1 ) for p in range( k ) ]
+    return tables
+
+
+#启动胖树网络：不连接控制器，使用静态ARP，主动下发全部流表
+def run( k=4 ):
+    topo = FatTreeTopo( k )
+    net = Mininet( topo=topo, controller=None, switch=OVSSwitch,
+                   autoStaticArp=True )
+    net.start()
+    for sw in net.switches:
+        sw.cmd( 'ovs-vsctl set bridge', sw, 'fail-mode=secure',
+                'protocols=OpenFlow13,OpenFlow14' )
+    FlowProgrammer( sudo=False ).apply( fattree_flows( topo ) )
+    CLI( net )
+    net.stop()
+
+
+topos = { 'fattree': ( lambda k=4: FatTreeTopo( int( k ) ) ) }
+
+if __name__ == '__main__':
+    setLogLevel( 'info' )
+    run( int( sys.argv[1] ) if len( sys.argv ) > 1 else 4 )
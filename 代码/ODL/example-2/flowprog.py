@@ -0,0 +1,90 @@
+#流表编程后端：在进程内生成每台交换机完整的期望流表，每台交换机一次 ovs-ofctl replace-flows 原子替换
+#默认使用OpenFlow 1.4 bundle，所有交换机并发执行，切换路径组时先装新的再删旧的（make-before-break）
+import os
+import subprocess
+import tempfile
+
+#ovs-ofctl在交换机不支持bundle（没有启用OpenFlow 1.4或不认识bundle消息）时的报错
+BUNDLE_UNSUPPORTED = ('version negotiation failed', 'OFPBRC_BAD_VERSION',
+	'OFPBRC_BAD_TYPE', 'OFPBRC_BAD_EXPERIMENTER')
+
+
+#按端口泛洪的规则：从上行端口进入的包发往所有下行端口，从下行端口进入的包发往所有上行端口
+#down_to_down为True时下行端口之间也互相转发（边缘、汇聚交换机）
+def flood_rules(up, down, down_to_down=True, priority=2):
+	flows = []
+	for port in up:
+		flows.append((port, list(down)))
+	for port in down:
+		out = list(up)
+		if down_to_down:
+			out += [p for p in down if p != port]
+		flows.append((port, out))
+	return ['priority=%d,in_port=%d,actions=%s' % (priority, port,
+		','.join('output:%d' % p for p in out)) for port, out in flows]
+
+
+class FlowProgrammer:
+
+	def __init__(self, protocol='OpenFlow13', sudo=True, bundle=True):
+		self.protocol = protocol
+		self.sudo = sudo
+		#bundle需要OpenFlow 1.4，不支持bundle的交换机退回到不带bundle的replace-flows
+		self.bundle = bundle
+		self.unbundled = set()
+
+	def _command(self, switch, path, bundle):
+		cmd = ['ovs-ofctl']
+		if bundle:
+			cmd += ['-O', 'OpenFlow14', '--bundle']
+		else:
+			cmd += ['-O', self.protocol]
+		cmd += ['replace-flows', switch, path]
+		if self.sudo:
+			cmd = ['sudo'] + cmd
+		return cmd
+
+	def _spawn(self, switch, path, bundle):
+		return subprocess.Popen(self._command(switch, path, bundle),
+			stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+
+	#把每台交换机的流表整体替换为tables中的内容：{switch: [flow, ...]}，空列表表示清空
+	#所有交换机并发执行，返回 {switch: 返回码}
+	def apply(self, tables):
+		files = {}
+		procs = {}
+		try:
+			for switch, flows in tables.items():
+				fd, path = tempfile.mkstemp(prefix='flows-%s-' % switch)
+				with os.fdopen(fd, 'w') as f:
+					f.write('\n'.join(flows) + '\n')
+				files[switch] = path
+				bundle = self.bundle and switch not in self.unbundled
+				procs[switch] = (self._spawn(switch, path, bundle), bundle)
+			result = {}
+			for switch, (proc, bundle) in procs.items():
+				err = proc.communicate()[1].decode().strip()
+				if proc.returncode != 0 and bundle and \
+						any(marker in err for marker in BUNDLE_UNSUPPORTED):
+					#只有交换机不支持bundle时才退回普通的replace-flows，之后该交换机都不再用bundle
+					print('%s does not support bundles (%s), falling back to '
+						'replace-flows without --bundle' % (switch, err))
+					self.unbundled.add(switch)
+					proc = self._spawn(switch, files[switch], False)
+					err = proc.communicate()[1].decode().strip()
+				if proc.returncode != 0:
+					print('replace-flows failed on %s: %s' % (switch, err))
+				result[switch] = proc.returncode
+			return result
+		finally:
+			for path in files.values():
+				os.remove(path)
+
+	#切换路径组：先整体装上新路径组的流表，全部成功后再清空只属于旧路径组的交换机
+	def switch_over(self, make, old):
+		result = self.apply(make)
+		if any(result.values()):
+			print('make phase failed, keep old path set: %s' % result)
+			return False
+		self.apply(dict((switch, []) for switch in old if switch not in make))
+		return True
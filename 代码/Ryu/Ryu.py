@@ -4,29 +4,298 @@ from ryu.controller.handler import CONFIG_DISPATCHER, DEAD_DISPATCHER
 from ryu.controller.handler import MAIN_DISPATCHER, HANDSHAKE_DISPATCHER
 from ryu.controller.handler import set_ev_cls
 from ryu.ofproto import ofproto_v1_3
+from ryu.ofproto import ofproto_parser
 from ryu.ofproto import ether
 from ryu.lib.packet import packet
 from ryu.lib.packet import ethernet
 from ryu.lib.packet import arp
-from ryu.lib.packet import ipv4
 from ryu.lib.packet import ipv6
+from ryu.lib.packet import icmpv6
+from ryu.ofproto import inet
+from ryu.topology import event as topo_event
+from ryu.lib import hub
 from ryu import utils
+from ryu.app.wsgi import ControllerBase, WSGIApplication, route
+from webob import Response
+
+import os
+import time
+
+import fastpkt
+from flowcache import FlowInstaller, match_key, actions_key
+from groups import GroupRegistry
+from host import HostTracker
+from mactable import MacTable
+from route import RouteEngine
+from shared import SharedState, shard_of
+from snapshot import Snapshot
+from metrics import Metrics
+from prefix import PrefixTable, int_to_ip, ip_to_int, prefix_mask
+
+#每对边缘交换机之间预计算的等价路径数（需以 ryu-manager --observe-links 启动以获得链路发现事件）
+MULTIPATH_K = 4
+
+#转发模式：single为单路径（每对交换机只取一条最短路，不用组表），ecmp为等权SELECT组表，
+#adaptive为在ecmp基础上按端口负载调整bucket权重
+MULTIPATH_MODE = os.environ.get('MULTIPATH_MODE', 'adaptive')
+
+#IPv4按目的前缀聚合转发（MULTIPATH_AGGREGATE=1）：每个交换机上出端口相同、地址连成完整对齐块的主机合并成一条前缀规则，
+#已知主机的首包不再上送控制器；同一边缘交换机下的主机地址连续时表项数随边缘交换机数而不是主机数增长
+#缺省关闭，按主机对下发路由规则，大流识别依赖按主机对的规则
+AGGREGATE = os.environ.get('MULTIPATH_AGGREGATE', '0') == '1'
+
+#组表编号起始值
+GROUP_ID_BASE = 50
+
+#广播组表（OFPGT_ALL）编号，每个交换机一个，bucket为生成树上的链路端口和所有主机端口
+BROADCAST_GROUP_ID = 1
+
+#端口统计的采样周期（秒）以及链路带宽（Mbit/s，与Topo.py中链路的bw一致）
+MONITOR_INTERVAL = 2
+
+LINK_BANDWIDTH = 10
+
+#利用率的平滑系数，以及bucket权重变化超过该值才下发OFPGC_MODIFY，防止权重来回抖动
+UTIL_ALPHA = 0.5
+
+WEIGHT_HYSTERESIS = 10
+
+#大流：经过组表分担的主机对速率超过该值（字节/秒，链路带宽的10%）时，用优先级4的精确规则固定到负载最低的出端口
+#固定后速率低于该值的一半，或空闲超过pin规则的idle_timeout，删除固定规则回到组表
+ELEPHANT_RATE = LINK_BANDWIDTH * 1000000 / 8.0 * 0.1
+
+#各类流表的 (idle_timeout, hard_timeout)，单位秒，0表示不超时
+#miss：table-miss规则，l2：按目的mac的二层转发规则，route：多路径路由规则（ipv4与ipv6），pin：大流的固定路径规则，
+#bcast：从生成树端口进入的广播直接交给广播组表的规则，prefix：按目的前缀聚合的IPv4规则（随主机表和拓扑增删，不超时）
+FLOW_TIMEOUTS = {
+    'miss': (0, 0),
+    'l2': (60, 0),
+    'route': (30, 0),
+    'pin': (10, 0),
+    'bcast': (0, 0),
+    'prefix': (0, 0),
+}
+
+#table-miss时送给控制器的字节数：交换机有缓存（n_buffers>0）时整帧留在交换机缓存中，只上送前MISS_SEND_LEN字节
+#（足够解码到ARP/IPv4/IPv6/NDP头），packet-out按buffer_id引用缓存的帧；交换机没有缓存或设为0时上送整帧
+MISS_SEND_LEN = int(os.environ.get('MULTIPATH_MISS_SEND_LEN', 128))
+
+#流表容量取交换机连接时table features上报的0号表max_entries，占用超过高水位时按流统计淘汰最冷的规则直到低水位；
+#交换机没有上报时使用FLOW_TABLE_SIZE
+FLOW_TABLE_SIZE = int(os.environ.get('MULTIPATH_FLOW_TABLE_SIZE', 2000))
+
+EVICT_HIGH = 0.9
+
+EVICT_LOW = 0.8
+
+#mac学习表与主机表的容量和老化时间（秒）；没有拓扑信息时，同一mac在该时间内从另一端口进入视为环路中的广播副本
+MAC_TABLE_SIZE = 100000
+
+MAC_AGING = 300
+
+MAC_MOVE_HOLD = 1
+
+#多控制器分片：实例总数与本实例编号，与Topo.py中的控制器一一对应（第i个实例监听6633+i端口）
+#交换机按 dpid % SHARD_COUNT 分给各实例，本实例只对自己分片内的交换机请求MASTER角色，其余为SLAVE
+SHARD_COUNT = int(os.environ.get('MULTIPATH_SHARDS', 1))
+
+SHARD_INDEX = int(os.environ.get('MULTIPATH_SHARD', 0))
+
+#各实例共享主机位置与链路的SQLite数据库，同步周期，以及超过多久没有心跳视为实例失效（秒）
+SHARED_DB = os.environ.get('MULTIPATH_SHARED_DB', '/tmp/multipath_shared.db')
+
+SHARD_SYNC_INTERVAL = 1
+
+SHARD_TIMEOUT = 5
+
+#状态快照的保存周期（秒）与文件，每个实例一份；重启后交换机重连时按快照对账，只补下发缺失的组表和流表
+SNAPSHOT_INTERVAL = 10
+
+SNAPSHOT_DB = os.environ.get('MULTIPATH_SNAPSHOT_DB',
+                             '/tmp/multipath_snapshot_%d.db' % SHARD_INDEX)
+
+#快照恢复的链路在这段时间内没有被LLDP重新发现时从拓扑中删除（秒）
+RESTORE_LINK_GRACE = 30
+
+#Prometheus指标的HTTP接口，由ryu的wsgi服务提供（--wsapi-port，默认8080）：GET /metrics
+class MetricsController(ControllerBase):
+
+    def __init__(self, req, link, data, **config):
+
+        super(MetricsController, self).__init__(req, link, data, **config)
+
+        self.app = data['multipath_app']
+
+    @route('metrics', '/metrics', methods=['GET'])
+    def metrics(self, req, **kwargs):
+
+        body = self.app.metrics.render()
+
+        return Response(content_type='text/plain', charset='utf-8',
+                        body=body.encode('utf-8'))
+
 
 class MULTIPATH_13(app_manager.RyuApp):
 
     OFP_VERSIONS = [ofproto_v1_3.OFP_VERSION]
 
+    _CONTEXTS = {'wsgi': WSGIApplication}
+
 
     #初始化函数，使用其超类也就是ryuapp程序的初始化并且创建mac地址与端口的映射表，以及一个标识符
     def __init__(self, *args, **kwargs):
 
         super(MULTIPATH_13, self).__init__(*args, **kwargs)
 
-        self.mac_to_port = {}
+        self.mac_to_port = MacTable(MAC_TABLE_SIZE, MAC_AGING)
 
         self.datapaths = {}
 
-        self.FLAGS = True
+        #路由引擎，以及按IP/MAC索引的全局主机位置表
+        self.route = RouteEngine(k=1 if MULTIPATH_MODE == 'single' else
+                                 MULTIPATH_K)
+
+        self.hosts = HostTracker(MAC_TABLE_SIZE, MAC_AGING)
+
+        #各交换机的组表登记：编号分配、出端口去重、bucket权重以及引用组表的流表
+        self.groups = GroupRegistry(GROUP_ID_BASE)
+
+        #流表下发缓存，去除重复下发并按交换机批量发送
+        self.flows = FlowInstaller(self.logger)
+
+        #各交换机0号流表的容量：dpid -> max_entries
+        self.table_size = {}
+
+        #正在等待流统计以便淘汰流表的交换机，以及分片到达的流统计
+        self.evicting = set()
+
+        self.flow_stats = {}
+
+        #已按路由下发流表的主机对：(源交换机, 目的交换机) -> {(源mac, 目的mac, 以太网类型)}
+        self.installed_pairs = {}
+
+        #端口统计：dpid -> {port: (发送字节数, 时间)}，以及平滑后的端口利用率
+        self.port_stats = {}
+
+        self.port_util = {}
+
+        #按流统计计算主机对速率：dpid -> {((以太网类型, 源mac, 目的mac), 优先级): (字节数, 时间)}
+        #以及已固定路径的大流：dpid -> {(以太网类型, 源mac, 目的mac): 出端口}
+        self.flow_bytes = {}
+
+        self.pinned = {}
+
+        #各交换机table-miss规则上送控制器的字节数（没有缓存的交换机为OFPCML_NO_BUFFER），
+        #以及当前packet-in缓存在交换机上的帧是否还没有被packet-out用掉
+        self.miss_len = {}
+
+        self.buffer_pending = False
+
+        #广播生成树：各交换机广播组表当前的出端口，以及装了广播转发规则的树端口
+        self.flood_ports = {}
+
+        self.bcast_rules = {}
+
+        #按目的前缀聚合的规则：dpid -> PrefixTable，上次聚合时的主机位置 {地址整数: (边缘交换机, 端口)}，
+        #以及各边缘交换机为终点的最短路出端口 {边缘交换机: {dpid: 出端口元组}}
+        self.prefix_tables = {}
+
+        self.prefix_hosts = {}
+
+        self.prefix_hops = {}
+
+        #多控制器分片：共享状态，各交换机当前请求的角色，以及存活的实例；单实例时不启用
+        self.shared = None
+
+        self.roles = {}
+
+        self.alive_shards = None
+
+        if SHARD_COUNT > 1:
+
+            self.shared = SharedState(SHARED_DB, SHARD_INDEX, SHARD_TIMEOUT)
+
+            self.alive_shards = self.shared.beat()
+
+            self.shard_thread = hub.spawn(self._shard_sync)
+
+        #状态快照：上次运行保存的组表与流表按交换机暂存，交换机连上后再对账；
+        #正在对账的交换机，以及分片到达的组表描述
+        self.snapshot = Snapshot(SNAPSHOT_DB)
+
+        self.snapshot_saved = 0
+
+        self.restored = {}
+
+        self.reconciling = {}
+
+        #快照恢复、还没有被LLDP重新发现的链路 {(交换机, 端口, 交换机, 端口)} 及其删除期限，
+        #以及快照中各交换机广播组表的出端口，收到组表描述核对之前视为仍在交换机上
+        self.restored_links = set()
+
+        self.links_deadline = 0
+
+        self.restored_flood = {}
+
+        self.group_desc = {}
+
+        #已请求组表描述、等待与本地组表登记对账的交换机，对账完成前不清理组表
+        self.verifying = set()
+
+        self.restore_snapshot()
+
+        self.snapshot_thread = hub.spawn(self._snapshot_loop)
+
+        #热路径指标：packet-in按交换机与包类型统计处理耗时，泛洪、流表、组表按交换机计数
+        self.metrics = Metrics()
+
+        self.metrics.describe('packet_in_seconds', 'histogram',
+                              'packet-in handling time', ('dpid', 'type'))
+
+        self.metrics.describe('flood_total', 'counter',
+                              'packets flooded', ('dpid',))
+
+        self.metrics.describe('flow_mod_total', 'counter',
+                              'add_flow calls, sent or dropped by the cache',
+                              ('dpid', 'rule', 'result'))
+
+        self.metrics.describe('add_flow_seconds', 'histogram',
+                              'add_flow time', ('dpid',))
+
+        self.metrics.describe('group_mod_total', 'counter',
+                              'group-mods sent', ('dpid', 'command'))
+
+        self.metrics.describe('group_mod_seconds', 'histogram',
+                              'send_group_mod time', ('dpid',))
+
+        self.metrics.describe('flow_table_entries', 'gauge',
+                              'flows installed per switch', ('dpid',))
+
+        self.metrics.describe('flow_cache_total', 'counter',
+                              'flow-mod cache and batching counters',
+                              ('event',))
+
+        self.metrics.describe('mac_table_entries', 'gauge',
+                              'mac learning table entries')
+
+        self.metrics.describe('hosts', 'gauge', 'known hosts')
+
+        self.metrics.describe('elephants_pinned', 'gauge',
+                              'elephant flows pinned to one path')
+
+        self.metrics.describe('groups', 'gauge',
+                              'multipath groups per switch', ('dpid',))
+
+        self.metrics.collectors.append(self.collect_metrics)
+
+        wsgi = kwargs.get('wsgi')
+
+        if wsgi is not None:
+
+            wsgi.register(MetricsController, {'multipath_app': self})
+
+        #后台统计线程，周期性向所有交换机请求端口统计
+        self.monitor_thread = hub.spawn(self._monitor)
 
     #错误处理函数，用与汇报消息msg的错误类型错误码等
     @set_ev_cls(
@@ -45,6 +314,17 @@ class MULTIPATH_13(app_manager.RyuApp):
 
                           utils.hex_array(msg.data))
 
+        self.flows.error(msg.datapath.id, msg.xid)
+
+    #barrier应答，确认一批流表已经被交换机处理
+    @set_ev_cls(ofp_event.EventOFPBarrierReply,
+
+                [CONFIG_DISPATCHER, MAIN_DISPATCHER])
+
+    def barrier_reply_handler(self, ev):
+
+        self.flows.barrier_reply(ev.msg.datapath.id, ev.msg.xid)
+
 
     #状态切换函数
 
@@ -68,6 +348,13 @@ class MULTIPATH_13(app_manager.RyuApp):
 
                 self.datapaths[datapath.id] = datapath
 
+                #此时端口描述已经到达，可以下发广播组表和前缀规则
+                self.update_broadcast()
+
+                self.update_prefixes()
+
+                self.flows.flush()
+
         #如果是连接断开的状态DEAD_DISPATCHER，则把该交换机从列表datapaths中删除
 
         elif ev.state == DEAD_DISPATCHER:
@@ -78,6 +365,52 @@ class MULTIPATH_13(app_manager.RyuApp):
 
                 del self.datapaths[datapath.id]
 
+                self.roles.pop(datapath.id, None)
+
+                self.table_size.pop(datapath.id, None)
+
+                self.forget_switch(datapath.id)
+
+                #对账没有完成，快照中的状态留到下次连接
+                state = self.reconciling.pop(datapath.id, None)
+
+                if state is not None:
+
+                    self.restored[datapath.id] = state
+
+    #丢弃本地为该交换机保存的状态（断开连接，或者交给其它实例管理）
+    def forget_switch(self, dpid):
+
+        self.groups.forget(dpid)
+
+        self.port_stats.pop(dpid, None)
+
+        self.port_util.pop(dpid, None)
+
+        self.flows.forget(dpid)
+
+        self.mac_to_port.remove_dpid(dpid)
+
+        self.evicting.discard(dpid)
+
+        self.flow_stats.pop(dpid, None)
+
+        self.group_desc.pop(dpid, None)
+
+        self.verifying.discard(dpid)
+
+        self.flow_bytes.pop(dpid, None)
+
+        self.pinned.pop(dpid, None)
+
+        self.flood_ports.pop(dpid, None)
+
+        self.restored_flood.pop(dpid, None)
+
+        self.bcast_rules.pop(dpid, None)
+
+        self.prefix_tables.pop(dpid, None)
+
     #控制器配置交换机
 
     @set_ev_cls(ofp_event.EventOFPSwitchFeatures, CONFIG_DISPATCHER)
@@ -94,358 +427,2275 @@ class MULTIPATH_13(app_manager.RyuApp):
         #协议解析parser
         match = parser.OFPMatch()
         #匹配域
-        actions = [parser.OFPActionOutput(ofproto.OFPP_CONTROLLER,
+        if MISS_SEND_LEN and ev.msg.n_buffers:
+
+            self.miss_len[dpid] = MISS_SEND_LEN
+
+        else:
 
-                                          ofproto.OFPCML_NO_BUFFER)]
+            self.miss_len[dpid] = ofproto.OFPCML_NO_BUFFER
+        #交换机有缓存时只上送帧头，没有缓存时上送整帧
+        datapath.send_msg(parser.OFPSetConfig(datapath, ofproto.OFPC_FRAG_NORMAL,
+
+                                              self.miss_len[dpid]))
+
+        actions = self.miss_actions(datapath)
         #动作（使用opf1.3协议让控制器连接上交换机）
-        self.add_flow(datapath, 0, 0, match, actions)
+        self.flows.forget(dpid)
+        #交换机重新连接，之前的流表缓存作废
+        datapath.send_msg(parser.OFPTableFeaturesStatsRequest(datapath, 0))
+        #查询流表容量，作为淘汰流表的阈值
+        if self.shared is not None and not self.request_role(datapath):
+
+            self.logger.info("switch:%s connected as slave", dpid)
+
+            return
+        #多实例时先请求角色，只有MASTER下发流表，SLAVE的流表修改会被交换机拒绝
+        self.add_flow(datapath, 'miss', 0, match, actions)
+
+        self.flows.flush()
         #下发连接流表到对应交换机上实现连接
         self.logger.info("switch:%s connected", dpid)
 
-    #下发流表
-    def add_flow(self, datapath, hard_timeout, priority, match, actions):
+        self.start_reconcile(datapath)
+        #快照中有该交换机时读取交换机上现有的组表和流表对账
 
-        ofproto = datapath.ofproto
+    #读回上次运行的快照：mac表、主机位置和主机对直接恢复，组表和流表等交换机连上后对账
+    def restore_snapshot(self):
 
-        #这个交换机采用的协议
+        state = self.snapshot.load()
 
-        parser = datapath.ofproto_parser
+        if state is None:
 
-        #协议解析
+            return
 
-        inst = [parser.OFPInstructionActions(ofproto.OFPIT_APPLY_ACTIONS,
+        self.snapshot_saved = state['saved']
 
-                                             actions)]
+        #先恢复链路再登记边缘交换机，重新发现同样的链路时路由不变，按旧路由下发的流表不用删除
+        for src, src_port, dst, dst_port in state['links']:
 
-        #inst调用南向接口实现动作actions的应用
+            self.route.add_link(src, src_port, dst, dst_port)
 
-        mod = parser.OFPFlowMod(datapath=datapath, priority=priority,
+            self.restored_links.add((src, src_port, dst, dst_port))
 
-                                hard_timeout=hard_timeout,
+        self.links_deadline = time.time() + RESTORE_LINK_GRACE
 
-                                match=match, instructions=inst)
+        self.restored_flood = dict(state['flood'])
 
-        #mod消息结构，通过mod消息对流表操作
+        for dpid, mac, port in state['macs']:
 
-        datapath.send_msg(mod)
+            self.mac_to_port.learn(dpid, mac, port)
 
-    #packetout消息
+        for mac, dpid, port, ips in state['hosts']:
 
-    def _build_packet_out(self, datapath, buffer_id, src_port, dst_port, data):
+            for ip in ips or [None]:
 
-        actions = []
+                self.hosts.learn(mac, dpid, port, ip)
 
-        if dst_port:
+            self.route.add_edge(dpid)
 
-            actions.append(datapath.ofproto_parser.OFPActionOutput(dst_port))
+        for src, dst, src_mac, dst_mac, eth_type in state['pairs']:
 
-        #如果存在目的端口则在动作列表中添加动作：交换机.协议解析.转发规则动作（目的端口）
+            self.installed_pairs.setdefault((src, dst), set()).add(
+                (src_mac, dst_mac, eth_type))
 
-        msg_data = None
+        for dpid, group_id, ports, weights in state['groups']:
 
-        if buffer_id == datapath.ofproto.OFP_NO_BUFFER:
+            entry = self.restored.setdefault(dpid, {'groups': {}, 'flows': []})
 
-            if data is None:
+            entry['groups'][group_id] = (ports, weights)
 
-                return None
+        for dpid, mod in state['flows']:
 
-            msg_data = data
+            entry = self.restored.setdefault(dpid, {'groups': {}, 'flows': []})
 
-        #如果这是个无效缓冲区间的buffer，而且里面有数据，就传给msg_data，否则返回空值
+            entry['flows'].append(mod)
 
-        out = datapath.ofproto_parser.OFPPacketOut(
+        self.logger.info("restored snapshot from %.0fs ago: %d macs, %d hosts, "
+                         "%d links, %d groups, %d flows",
+                         time.time() - state['saved'], len(state['macs']),
+                         len(state['hosts']), len(state['links']),
+                         len(state['groups']), len(state['flows']))
 
-            datapath=datapath, buffer_id=buffer_id,
+    def _snapshot_loop(self):
 
-            data=msg_data, in_port=src_port, actions=actions)
+        while True:
 
-        return out
+            hub.sleep(SNAPSHOT_INTERVAL)
 
-        #返回out消息
+            self.save_snapshot()
 
-    #下发packet_out消息的函数
-    def send_packet_out(self, datapath, buffer_id, src_port, dst_port, data):
+    #保存当前状态；还没有重连或正在对账的交换机保存快照中原有的内容
+    def save_snapshot(self):
 
-        out = self._build_packet_out(datapath, buffer_id,
+        macs = list(self.mac_to_port.items())
 
-                                     src_port, dst_port, data)
+        hosts = [(host.mac, host.dpid, host.port, sorted(host.ips))
+                 for host in self.hosts.by_mac.values()]
 
-        if out:
+        groups = []
 
-            datapath.send_msg(out)
+        for dpid, ports_of in self.groups.ports.items():
 
+            weights = self.groups.weights.get(dpid, {})
 
-    #广播消息
-    def flood(self, msg):
+            for group_id, ports in ports_of.items():
 
-        datapath = msg.datapath
+                groups.append((dpid, group_id, ports, weights.get(group_id)))
+
+        #table-miss规则在交换机连上时按当前配置下发，广播规则和前缀规则按当前拓扑与主机表重建，不写入快照
+        flows = [(dpid, mod.to_jsondict())
+                 for dpid, mods in self.flows.mods.items()
+                 for mod in mods.values() if mod.priority not in (0, 2) and
+                 mod.match.get('ipv4_dst') is None]
+
+        for dpid, state in list(self.restored.items()) + \
+                list(self.reconciling.items()):
+
+            for group_id, (ports, weights) in state['groups'].items():
+
+                groups.append((dpid, group_id, ports, weights))
+
+            flows.extend((dpid, mod) for mod in state['flows'])
+
+        pairs = [(src, dst) + member
+                 for (src, dst), members in self.installed_pairs.items()
+                 for member in members]
+
+        adj = self.route.adj
+
+        links = [(src, port, dst, adj[dst][src])
+                 for src, nbrs in adj.items() for dst, port in nbrs.items()
+                 if src < dst and src in adj.get(dst, {})]
+
+        flood = list(self.flood_ports.items()) + \
+            [(dpid, ports) for dpid, ports in self.restored_flood.items()
+             if dpid not in self.flood_ports]
+
+        try:
+
+            self.snapshot.save(macs, hosts, groups, flows, pairs, links, flood)
+
+        except Exception as e:
+
+            self.logger.warning("save snapshot failed: %s", e)
+
+    #每次连接都请求组表描述，与本地组表登记对账；快照中有该交换机时再请求流统计，
+    #组表的应答先到，补齐组表后再补流表
+    def start_reconcile(self, datapath):
 
         ofproto = datapath.ofproto
 
         parser = datapath.ofproto_parser
 
-        out = self._build_packet_out(datapath, ofproto.OFP_NO_BUFFER,
+        self.verifying.add(datapath.id)
 
-                                     ofproto.OFPP_CONTROLLER,
+        datapath.send_msg(parser.OFPGroupDescStatsRequest(datapath, 0))
 
-                                     ofproto.OFPP_FLOOD, msg.data)
+        state = self.restored.pop(datapath.id, None)
 
-        #广播消息的datapath，对应协议，协议解析器，消息结构设置
+        if state is None:
 
-        datapath.send_msg(out)
+            return
 
-        #下发给交换机
+        self.reconciling[datapath.id] = state
 
-        self.logger.debug("Flooding msg")
+        req = parser.OFPFlowStatsRequest(datapath, 0, ofproto.OFPTT_ALL,
+                                         ofproto.OFPP_ANY, ofproto.OFPG_ANY)
 
+        datapath.send_msg(req)
 
-    #ARP转发函数
-    def arp_forwarding(self, msg, src_ip, dst_ip, eth_pkt):
+    @set_ev_cls(ofp_event.EventOFPGroupDescStatsReply, MAIN_DISPATCHER)
+    def group_desc_reply_handler(self, ev):
+
+        msg = ev.msg
 
         datapath = msg.datapath
 
+        dpid = datapath.id
+
+        self.group_desc.setdefault(dpid, []).extend(msg.body)
+
+        if msg.flags & datapath.ofproto.OFPMPF_REPLY_MORE:
+
+            return
+
+        stats = self.group_desc.pop(dpid)
+
+        self.verifying.discard(dpid)
+
+        state = self.reconciling.get(dpid)
+
+        self.reconcile_groups(datapath, state['groups'] if state else {}, stats)
+
+    #交换机上已有的SELECT组表与本地登记对账：
+    #本地没有登记的按出端口登记下来（没有流表引用时由下一次清理删除），与本地登记重复的出端口直接删除，
+    #同一编号本地登记的出端口不同时按本地登记改写；快照中有而交换机上没有的组表重新下发
+    def reconcile_groups(self, datapath, groups, stats):
+
+        dpid = datapath.id
+
+        ofproto = datapath.ofproto
+
         parser = datapath.ofproto_parser
 
-        in_port = msg.match['in_port']
+        present = set()
 
-        out_port = self.mac_to_port[datapath.id].get(eth_pkt.dst)
+        fixed = 0
 
-        #交换机，协议解析器，入端口，出端口（来自于映射表中的目的地址）
+        bcast = None
 
-        #如果出端口在映射表中，则转发
+        for stat in stats:
 
-        if out_port is not None:
+            #广播组表不参与多路径组表的编号，只核对快照恢复的出端口
+            if stat.type != ofproto.OFPGT_SELECT:
 
-            match = parser.OFPMatch(in_port=in_port, eth_dst=eth_pkt.dst,
+                if stat.group_id == BROADCAST_GROUP_ID:
 
-                                    eth_type=eth_pkt.ethertype)
+                    bcast = tuple(sorted(
+                        action.port for bucket in stat.buckets
+                        for action in bucket.actions
+                        if isinstance(action, parser.OFPActionOutput)))
 
-            actions = [parser.OFPActionOutput(out_port)]
+                continue
 
-            self.add_flow(datapath, 0, 1, match, actions)
+            present.add(stat.group_id)
 
-            self.send_packet_out(datapath, msg.buffer_id, in_port,
+            ports = tuple(action.port for bucket in stat.buckets
+                          for action in bucket.actions
+                          if isinstance(action, parser.OFPActionOutput))
 
-                                 out_port, msg.data)
+            local = self.groups.ports.get(dpid, {}).get(stat.group_id)
 
-            self.logger.debug("Reply ARP to knew host")
+            if local is None and self.groups.lookup(dpid, ports) is None:
 
-             #匹配域，动作，packetout消息下发，提供转发规则
+                self.groups.register(dpid, stat.group_id, ports,
+                                     tuple(bucket.weight
+                                           for bucket in stat.buckets))
 
-        else:
+            elif local is None:
 
-            #因为找不到所以广播
+                datapath.send_msg(parser.OFPGroupMod(
+                    datapath, ofproto.OFPGC_DELETE, ofproto.OFPGT_SELECT,
+                    stat.group_id))
 
-            self.flood(msg)
+                fixed += 1
 
+            elif local != ports:
 
-    #地址学习，传参有交换机id，源地址，入端口
-    def mac_learning(self, dpid, src_mac, in_port):
+                self.send_group_mod(
+                    datapath, stat.group_id, local,
+                    self.groups.weights.get(dpid, {}).get(stat.group_id),
+                    ofproto.OFPGC_MODIFY)
 
-        self.mac_to_port.setdefault(dpid, {})
+                fixed += 1
 
-        #把源地址与该交换机的入端口匹配，返回值表示匹配是否成功
+        added = 0
 
-        if src_mac in self.mac_to_port[dpid]:
+        for group_id, (ports, group_weights) in groups.items():
 
-            if in_port != self.mac_to_port[dpid][src_mac]:
+            if group_id in present or \
+                    group_id in self.groups.ports.get(dpid, {}) or \
+                    self.groups.lookup(dpid, ports) is not None:
 
-                return False
+                continue
 
-        else:
+            self.groups.register(dpid, group_id, ports, group_weights)
 
-            self.mac_to_port[dpid][src_mac] = in_port
+            self.send_group_mod(datapath, group_id, ports, group_weights)
 
-            return True
+            added += 1
 
-    #发送组表消息（用于控制负载均衡）
+        self.logger.info("verified groups on s%s: %d present, %d corrected, "
+                         "%d re-added", dpid, len(present), fixed, added)
 
-    def send_group_mod(self, datapath,):
+        self.verify_broadcast(datapath, bcast)
 
-        ofproto = datapath.ofproto
+    #交换机上的广播组表与快照中的不一致（例如交换机也重启过）时不再沿用快照，
+    #已经按快照沿用了的按当前生成树重建
+    def verify_broadcast(self, datapath, ports):
 
-        ofp_parser = datapath.ofproto_parser
+        restored = self.restored_flood.pop(datapath.id, None)
 
-        #协议以及协议解析器
+        if restored is None or restored == ports:
 
-        port_1 = 3
+            return
 
-        queue_1 = ofp_parser.OFPActionSetQueue(0)
+        self.logger.info("broadcast group on s%s differs from snapshot: %s",
+                         datapath.id, ports)
 
-        actions_1 = [queue_1, ofp_parser.OFPActionOutput(port_1)]
+        if self.flood_ports.pop(datapath.id, None) is not None:
 
+            self.update_broadcast()
 
+    #快照中的流表交换机上已经有的直接登记进下发缓存；交换机上没有、且按超时时间还不会过期的重新下发
+    #不在快照中的流表（例如其它应用下发的LLDP规则）不登记，也不会被淘汰
+    def reconcile_flows(self, datapath, flows, stats):
 
-        port_2 = 2
+        parser = datapath.ofproto_parser
 
-        queue_2 = ofp_parser.OFPActionSetQueue(0)
+        present = {}
 
-        actions_2 = [queue_2, ofp_parser.OFPActionOutput(port_2)]
+        for stat in stats:
 
-        #设置了两种动作两个队列让流量入队，当队列达到带宽限制的时候就不能入队，此时需要入另外一个队
+            actions = []
 
-        weight_1 = 50
+            for inst in stat.instructions:
 
-        weight_2 = 50
+                if isinstance(inst, parser.OFPInstructionActions):
 
+                    actions.extend(inst.actions)
 
+            present[(stat.priority, match_key(stat.match))] = \
+                actions_key(actions)
 
-        watch_port = ofproto_v1_3.OFPP_ANY
+        age = time.time() - self.snapshot_saved
 
-        watch_group = ofproto_v1_3.OFPQ_ALL
+        pushed = 0
 
+        for jsondict in flows:
 
+            mod = ofproto_parser.ofp_msg_from_jsondict(datapath, jsondict)
 
-        buckets = [
+            actions = []
 
-            ofp_parser.OFPBucket(weight_1, watch_port, watch_group, actions_1),
+            for inst in mod.instructions:
 
-            ofp_parser.OFPBucket(weight_2, watch_port, watch_group, actions_2)]
+                actions.extend(getattr(inst, 'actions', []))
 
-        #设置了组表的规则buckets
+            key = (mod.priority, match_key(mod.match))
 
-        group_id = 50
+            #恢复流表对组表的引用
+            for action in actions:
 
-        req = ofp_parser.OFPGroupMod(datapath, ofproto.OFPFC_ADD,
+                if isinstance(action, parser.OFPActionGroup):
 
-                                     ofproto.OFPGT_SELECT, group_id, buckets)
+                    self.groups.ref(datapath.id, key, action.group_id)
 
+            if present.get(key) == actions_key(actions):
 
+                self.flows.adopt(datapath, mod, mod.priority, mod.match,
+                                 actions)
 
-        datapath.send_msg(req)
+                continue
 
-        #下发组表规则
+            timeouts = [t for t in (mod.idle_timeout, mod.hard_timeout) if t]
 
-    #包的处理程序，分为ipv4包和ipv6包
-    @set_ev_cls(ofp_event.EventOFPPacketIn, MAIN_DISPATCHER)
+            if timeouts and age > min(timeouts):
 
-    def _packet_in_handler(self, ev):
+                continue
 
-        msg = ev.msg
+            if self.flows.install(datapath, mod, mod.priority, mod.match,
+                                  actions):
 
-        datapath = msg.datapath
+                pushed += 1
 
-        dpid = datapath.id
+        self.flows.flush()
 
-        parser = datapath.ofproto_parser
+        self.logger.info("reconciled flows on s%s: %d present, %d re-pushed",
+                         datapath.id, len(stats), pushed)
 
-        in_port = msg.match['in_port']
+    #本实例是否负责该交换机，单实例时负责全部交换机
+    def owns(self, dpid):
 
-        pkt = packet.Packet(msg.data)
+        if self.shared is None:
 
-        eth = pkt.get_protocols(ethernet.ethernet)[0]
+            return True
 
-        arp_pkt = pkt.get_protocol(arp.arp)
+        return shard_of(dpid, SHARD_COUNT, self.alive_shards) == SHARD_INDEX
 
-        ip_pkt = pkt.get_protocol(ipv4.ipv4)
+    #按分片归属请求MASTER或SLAVE角色，generation_id由共享计数器分配保证单调递增，返回是否为MASTER
+    def request_role(self, datapath):
 
-        ip_pkt_6 = pkt.get_protocol(ipv6.ipv6)
+        ofproto = datapath.ofproto
 
-        #消息，交换机，交换机id，协议解析器，入端口，数据包，以太网协议，arp包，ip4包，ipv6包
+        parser = datapath.ofproto_parser
 
-        #如果ipv6是实例，则采用含有ipv6的规则
-        if isinstance(ip_pkt_6, ipv6.ipv6):
+        master = self.owns(datapath.id)
 
-            actions = []
+        if master:
 
-            match = parser.OFPMatch(eth_type=ether.ETH_TYPE_IPV6)
+            role = ofproto.OFPCR_ROLE_MASTER
 
-            self.add_flow(datapath, 0, 1, match, actions)
+        else:
 
-            return
+            role = ofproto.OFPCR_ROLE_SLAVE
 
+        self.roles[datapath.id] = role
 
-        #如果arp是实例，则采用含有arp的规则
-        if isinstance(arp_pkt, arp.arp):
+        req = parser.OFPRoleRequest(datapath, role,
+                                    self.shared.next_generation())
 
-            self.logger.debug("ARP processing")
+        datapath.send_msg(req)
 
-            if self.mac_learning(dpid, eth.src, in_port) is False:
+        return master
 
-                self.logger.debug("ARP packet enter in different ports")
+    @set_ev_cls(ofp_event.EventOFPRoleReply,
+                [CONFIG_DISPATCHER, MAIN_DISPATCHER])
+    def role_reply_handler(self, ev):
 
-                return
+        msg = ev.msg
 
+        ofproto = msg.datapath.ofproto
 
+        if msg.role == ofproto.OFPCR_ROLE_MASTER:
 
-            self.arp_forwarding(msg, arp_pkt.src_ip, arp_pkt.dst_ip, eth)
+            role = 'MASTER'
+
+        elif msg.role == ofproto.OFPCR_ROLE_SLAVE:
+
+            role = 'SLAVE'
 
-        #如果ipv4是实例，则采用含有ipv4协议的规则
-        if isinstance(ip_pkt, ipv4.ipv4):
+        else:
+
+            role = 'EQUAL'
 
-            self.logger.debug("IPV4 processing")
+        self.logger.info("s%s role %s generation=%d", msg.datapath.id, role,
+                         msg.generation_id)
 
-            out_port = None
-            #如果以太网的目的地址在映射表中存在则下发组表
-            if eth.dst in self.mac_to_port[dpid]:
+    #分片同步线程：心跳，失效实例的交换机顺延给下一个实例接管，写入本实例攒下的主机发布，
+    #导入其它实例发布的链路与主机；数据库读写都在这里，不在packet-in路径上
+    def _shard_sync(self):
 
-	#如果是1/2/3号交换机则下发组表（负载均衡规则），因为1/2/3号交换机是分岔口
+        while True:
 
-               if (dpid == 1 or dpid == 2 or dpid == 3) and in_port == 1:
+            hub.sleep(SHARD_SYNC_INTERVAL)
 
-                    if self.FLAGS1 is True:
+            self.alive_shards = self.shared.beat()
 
-                        self.send_group_mod(datapath)
+            for datapath in list(self.datapaths.values()):
 
-                        self.logger.info("send_group_mod to s1")
+                self.update_role(datapath)
 
-                        self.FLAGS1 = False
-		    
-                    if self.FLAGS2 is True:
+            try:
 
-                        self.send_group_mod(datapath)
+                self.shared.flush()
 
-                        self.logger.info("send_group_mod to s2")
+            except Exception as e:
 
-                        self.FLAGS2 = False
+                self.logger.warning("publish hosts failed: %s", e)
 
-                    if self.FLAGS3 is True:
+            self.apply_shared()
 
-                        self.send_group_mod(datapath)
+            self.flows.flush()
 
-                        self.logger.info("send_group_mod to s3")
+    #交换机归属变化时重新请求角色
+    def update_role(self, datapath):
+
+        dpid = datapath.id
 
-                        self.FLAGS3 = False
+        ofproto = datapath.ofproto
 
-	    #从组表中选择一个规则进行下发
+        parser = datapath.ofproto_parser
 
-                    actions = [parser.OFPActionGroup(group_id=50)]
+        master = self.roles.get(dpid) == ofproto.OFPCR_ROLE_MASTER
 
-                    match = parser.OFPMatch(in_port=in_port,
+        if self.owns(dpid) == master:
 
-                                            eth_type=eth.ethertype,
+            return
 
-                                            ipv4_src=ip_pkt.src)
+        self.forget_switch(dpid)
 
-                    self.add_flow(datapath, 0, 3, match, actions)
+        if not self.request_role(datapath):
 
-                    self.send_packet_out(datapath, msg.buffer_id,
+            self.logger.info("hand s%s back to shard %d", dpid,
+                             shard_of(dpid, SHARD_COUNT, self.alive_shards))
 
-                                         in_port, 2, msg.data)
+            return
+
+        #接管：原MASTER分配的组表编号本实例不知道，全部删除（引用它们的流表随之被交换机删除）
+        datapath.send_msg(parser.OFPGroupMod(datapath, ofproto.OFPGC_DELETE,
+                                             0, ofproto.OFPG_ALL))
+
+        self.add_flow(datapath, 'miss', 0, parser.OFPMatch(),
+                      self.miss_actions(datapath))
+
+        self.update_broadcast()
+
+        self.logger.info("take over s%s", dpid)
+
+    #按序重放共享状态中的变化：链路加入路由引擎，主机按所在交换机登记
+    def apply_shared(self):
+
+        hosts, links = self.shared.pull()
+
+        for src, src_port, dst, dst_port, alive in links:
+
+            if alive:
+
+                self.hosts.remove_port(src, src_port)
+
+                self.hosts.remove_port(dst, dst_port)
+
+                self.confirm_link(src, src_port, dst, dst_port)
+
+                changed = self.route.add_link(src, src_port, dst, dst_port)
+
+            else:
+
+                changed = self.route.remove_link(src, dst)
+
+            self.invalidate_routes(changed)
+
+        if links:
+
+            self.update_broadcast()
+
+        for mac, dpid, port, ip in hosts:
+
+            self.host_learning(dpid, mac, port, ip)
+
+    #本地主机表中没有时查询共享状态（同步线程刷新的内存缓存），查到后登记到本地
+    def shared_host(self, mac=None, ip=None):
+
+        if self.shared is None:
+
+            return False
+
+        row = self.shared.lookup_host(mac=mac, ip=ip)
+
+        if row is None:
+
+            return False
+
+        self.host_learning(row[1], row[0], row[2], row[3])
+
+        return True
+
+    #下发流表，超时时间按规则类别rule从FLOW_TIMEOUTS中取
+    def add_flow(self, datapath, rule, priority, match, actions):
+
+        start = time.perf_counter()
+
+        ofproto = datapath.ofproto
+
+        #这个交换机采用的协议
+
+        parser = datapath.ofproto_parser
+
+        #协议解析
+
+        idle_timeout, hard_timeout = FLOW_TIMEOUTS[rule]
+
+        #会超时的流表要求交换机在删除时上报FlowRemoved，用于流表占用统计
+
+        flags = 0
+
+        if idle_timeout or hard_timeout:
+
+            flags = ofproto.OFPFF_SEND_FLOW_REM
+
+        def mod():
+
+            inst = [parser.OFPInstructionActions(ofproto.OFPIT_APPLY_ACTIONS,
+
+                                                 actions)]
+
+            #inst调用南向接口实现动作actions的应用
+
+            return parser.OFPFlowMod(datapath=datapath, priority=priority,
+
+                                     idle_timeout=idle_timeout,
+
+                                     hard_timeout=hard_timeout, flags=flags,
+
+                                     match=match, instructions=inst)
+
+        #mod消息结构，通过mod消息对流表操作，交给缓存去重后批量下发；命中缓存时不构造消息
+
+        if self.flows.install(datapath, mod, priority, match, actions):
+
+            self.check_occupancy(datapath)
+
+            result = 'sent'
+
+        else:
+
+            result = 'cached'
+
+        self.metrics.inc('flow_mod_total', datapath.id, rule, result)
+
+        self.metrics.observe('add_flow_seconds', time.perf_counter() - start,
+                             datapath.id)
+
+    #table features应答：记录0号表的容量，应答分多个消息时0号表只出现在其中一个里
+    @set_ev_cls(ofp_event.EventOFPTableFeaturesStatsReply,
+
+                [CONFIG_DISPATCHER, MAIN_DISPATCHER])
+
+    def table_features_reply_handler(self, ev):
+
+        dpid = ev.msg.datapath.id
+
+        for stat in ev.msg.body:
+
+            if stat.table_id == 0 and stat.max_entries:
+
+                self.table_size[dpid] = stat.max_entries
+
+                self.logger.info("flow table of s%s holds %d entries", dpid,
+
+                                 stat.max_entries)
+
+    def table_capacity(self, dpid):
+
+        return self.table_size.get(dpid, FLOW_TABLE_SIZE)
+
+    #流表占用超过高水位时请求流统计，在应答中淘汰最冷的规则
+    def check_occupancy(self, datapath):
+
+        dpid = datapath.id
+
+        if dpid in self.evicting:
+
+            return
+
+        if self.flows.occupancy(dpid) < self.table_capacity(dpid) * EVICT_HIGH:
+
+            return
+
+        self.evicting.add(dpid)
+
+        ofproto = datapath.ofproto
+
+        parser = datapath.ofproto_parser
+
+        req = parser.OFPFlowStatsRequest(datapath, 0, 0, ofproto.OFPP_ANY,
+
+                                         ofproto.OFPG_ANY)
+
+        datapath.send_msg(req)
+
+        self.logger.info("flow table of s%s nearly full (%d), evicting",
+
+                         dpid, self.flows.occupancy(dpid))
+
+    @set_ev_cls(ofp_event.EventOFPFlowStatsReply, MAIN_DISPATCHER)
+
+    def flow_stats_reply_handler(self, ev):
+
+        msg = ev.msg
+
+        datapath = msg.datapath
+
+        dpid = datapath.id
+
+        self.flow_stats.setdefault(dpid, []).extend(msg.body)
+
+        #统计分多个消息返回时等最后一片到达再处理
+
+        if msg.flags & datapath.ofproto.OFPMPF_REPLY_MORE:
+
+            return
+
+        stats = self.flow_stats.pop(dpid)
+
+        state = self.reconciling.pop(dpid, None)
+
+        if state is not None:
+
+            self.reconcile_flows(datapath, state['flows'], stats)
+
+        if dpid in self.evicting:
+
+            self.evicting.discard(dpid)
+
+            self.evict_flows(datapath, stats)
+
+        self.detect_elephants(datapath, stats)
+
+    #大流识别：组表分担的路由规则速率超过阈值时固定到负载最低的出端口，固定规则速率回落后删除
+    def detect_elephants(self, datapath, stats):
+
+        dpid = datapath.id
+
+        parser = datapath.ofproto_parser
+
+        groups = self.groups.ports.get(dpid, {})
+
+        pinned = self.pinned.setdefault(dpid, {})
+
+        if not groups and not pinned:
+
+            return
+
+        last = self.flow_bytes.get(dpid, {})
+
+        current = self.flow_bytes[dpid] = {}
+
+        #各出端口当前的发送速率，本轮固定的大流速率也计入，避免多个大流挤到同一个端口
+        capacity = LINK_BANDWIDTH * 1000000 / 8.0
+
+        load = dict((port, util * capacity) for port, util in
+                    self.port_util.get(dpid, {}).items())
+
+        for stat in stats:
+
+            if stat.priority not in (3, 4):
+
+                continue
+
+            key = (stat.match.get('eth_type'), stat.match.get('eth_src'),
+                   stat.match.get('eth_dst'))
+
+            if None in key:
+
+                continue
+
+            now = stat.duration_sec + stat.duration_nsec / 1e9
+
+            current[key, stat.priority] = (stat.byte_count, now)
+
+            old = last.get((key, stat.priority))
+
+            if old is None or now <= old[1] or stat.byte_count < old[0]:
+
+                continue
+
+            rate = (stat.byte_count - old[0]) / (now - old[1])
+
+            if stat.priority == 4:
+
+                if key in pinned and rate < ELEPHANT_RATE / 2:
+
+                    self.unpin(datapath, key)
+
+                continue
+
+            if rate < ELEPHANT_RATE or key in pinned:
+
+                continue
+
+            ports = None
+
+            for inst in stat.instructions:
+
+                for action in getattr(inst, 'actions', []):
+
+                    if isinstance(action, parser.OFPActionGroup):
+
+                        ports = groups.get(action.group_id)
+
+            if not ports:
+
+                continue
+
+            port = min(ports, key=lambda p: load.get(p, 0.0))
+
+            load[port] = load.get(port, 0.0) + rate
+
+            self.pin(datapath, key, port)
+
+            self.logger.info("elephant %s -> %s on s%s: %.0f B/s pinned to "
+                             "port %s", key[1], key[2], dpid, rate, port)
+
+        self.flows.flush()
+
+    def pin(self, datapath, key, port):
+
+        parser = datapath.ofproto_parser
+
+        eth_type, src, dst = key
+
+        match = parser.OFPMatch(eth_type=eth_type, eth_src=src, eth_dst=dst)
+
+        self.add_flow(datapath, 'pin', 4, match,
+                      [parser.OFPActionOutput(port)])
+
+        self.pinned.setdefault(datapath.id, {})[key] = port
+
+    def unpin(self, datapath, key):
+
+        ofproto = datapath.ofproto
+
+        parser = datapath.ofproto_parser
+
+        eth_type, src, dst = key
+
+        match = parser.OFPMatch(eth_type=eth_type, eth_src=src, eth_dst=dst)
+
+        mod = parser.OFPFlowMod(datapath=datapath,
+                                command=ofproto.OFPFC_DELETE_STRICT,
+                                priority=4, out_port=ofproto.OFPP_ANY,
+                                out_group=ofproto.OFPG_ANY, match=match)
+
+        self.flows.delete(datapath, mod, match, 4)
+
+        self.pinned.get(datapath.id, {}).pop(key, None)
+
+        self.logger.info("elephant %s -> %s on s%s unpinned", src, dst,
+                         datapath.id)
+
+    #按平均包速率从低到高淘汰本应用下发的规则，table-miss规则、广播规则和前缀规则不淘汰
+    def evict_flows(self, datapath, stats):
+
+        ofproto = datapath.ofproto
+
+        parser = datapath.ofproto_parser
+
+        excess = self.flows.occupancy(datapath.id) - int(
+
+            self.table_capacity(datapath.id) * EVICT_LOW)
+
+        if excess <= 0:
+
+            return
+
+        #只从本应用下发并记录在缓存中的规则里挑选，LLDP等其它应用的规则不动
+        installed = self.flows.installed.get(datapath.id, {})
+
+        stats = [stat for stat in stats if stat.priority not in (0, 2) and
+                 stat.match.get('ipv4_dst') is None and
+                 (stat.priority, match_key(stat.match)) in installed]
+
+        stats.sort(key=lambda stat: stat.packet_count /
+
+                   float(max(stat.duration_sec, 1)))
+
+        for stat in stats[:excess]:
+
+            mod = parser.OFPFlowMod(datapath=datapath,
+
+                                    command=ofproto.OFPFC_DELETE_STRICT,
+
+                                    priority=stat.priority,
+
+                                    out_port=ofproto.OFPP_ANY,
+
+                                    out_group=ofproto.OFPG_ANY,
+
+                                    match=stat.match)
+
+            self.flows.delete(datapath, mod, stat.match, stat.priority)
+
+        self.flows.flush()
+
+        self.logger.info("evicted %d flows from s%s",
+
+                         min(excess, len(stats)), datapath.id)
+
+    #流表超时或被删除，更新流表占用
+    @set_ev_cls(ofp_event.EventOFPFlowRemoved, MAIN_DISPATCHER)
+
+    def flow_removed_handler(self, ev):
+
+        msg = ev.msg
+
+        self.flows.removed(msg.datapath.id, msg.priority, msg.match)
+
+        #路由规则超时或被删除，主机对下一个packet-in时重新下发整条路由
+        if msg.priority == 3:
+
+            member = (msg.match.get('eth_src'), msg.match.get('eth_dst'),
+                      msg.match.get('eth_type'))
+
+            for hosts in self.installed_pairs.values():
+
+                hosts.discard(member)
+
+        #固定规则超时或被删除，大流回到组表
+        if msg.priority == 4:
+
+            key = (msg.match.get('eth_type'), msg.match.get('eth_src'),
+                   msg.match.get('eth_dst'))
+
+            self.pinned.get(msg.datapath.id, {}).pop(key, None)
+
+        self.logger.debug("flow removed from s%s: reason=%d priority=%d %s",
+
+                          msg.datapath.id, msg.reason, msg.priority,
+
+                          msg.match)
+
+    #删除匹配的流表（非严格匹配）
+    def del_flows(self, datapath, match):
+
+        ofproto = datapath.ofproto
+
+        parser = datapath.ofproto_parser
+
+        mod = parser.OFPFlowMod(datapath=datapath,
+
+                                command=ofproto.OFPFC_DELETE,
+
+                                out_port=ofproto.OFPP_ANY,
+
+                                out_group=ofproto.OFPG_ANY,
+
+                                match=match)
+
+        self.flows.delete(datapath, mod, match)
+
+    #table-miss规则的动作，上送字节数按交换机是否有缓存决定
+    def miss_actions(self, datapath):
+
+        ofproto = datapath.ofproto
+
+        max_len = self.miss_len.get(datapath.id, ofproto.OFPCML_NO_BUFFER)
+
+        return [datapath.ofproto_parser.OFPActionOutput(ofproto.OFPP_CONTROLLER,
+
+                                                        max_len)]
+
+    #packetout消息，actions缺省时从dst_port转发
+
+    def _build_packet_out(self, datapath, buffer_id, src_port, dst_port, data,
+
+                          actions=None):
+
+        if actions is None:
+
+            actions = []
+
+            if dst_port:
+
+                actions.append(datapath.ofproto_parser.OFPActionOutput(dst_port))
+
+        #如果存在目的端口则在动作列表中添加动作：交换机.协议解析.转发规则动作（目的端口）
+
+        msg_data = None
+
+        if buffer_id == datapath.ofproto.OFP_NO_BUFFER:
+
+            if data is None:
+
+                return None
+
+            msg_data = data
+
+        #如果这是个无效缓冲区间的buffer，而且里面有数据，就传给msg_data，否则返回空值
+
+        out = datapath.ofproto_parser.OFPPacketOut(
+
+            datapath=datapath, buffer_id=buffer_id,
+
+            data=msg_data, in_port=src_port, actions=actions)
+
+        return out
+
+        #返回out消息
+
+    #下发packet_out消息的函数
+    def send_packet_out(self, datapath, buffer_id, src_port, dst_port, data):
+
+        out = self._build_packet_out(datapath, buffer_id,
+
+                                     src_port, dst_port, data)
+
+        if out:
+
+            #排在本次packet-in产生的流表修改之后，路径上的交换机都确认装好规则后才发出
+            self.flows.send_after(datapath, out)
+
+            #交换机缓存的帧已经随这个packet-out发出
+            if buffer_id != datapath.ofproto.OFP_NO_BUFFER:
+
+                self.buffer_pending = False
+
+    #packet-in的帧缓存在交换机上，但处理后没有发出（丢弃、由控制器代答）时，用不带动作的packet-out释放缓存
+    def release_buffer(self, msg):
+
+        datapath = msg.datapath
+
+        out = datapath.ofproto_parser.OFPPacketOut(
+
+            datapath=datapath, buffer_id=msg.buffer_id,
+
+            in_port=msg.match['in_port'], actions=[], data=None)
+
+        datapath.send_msg(out)
+
+        self.buffer_pending = False
+
+
+    #广播消息
+    def flood(self, msg):
+
+        datapath = msg.datapath
+
+        ofproto = datapath.ofproto
+
+        parser = datapath.ofproto_parser
+
+        in_port = msg.match['in_port']
+
+        #从不在生成树上的链路端口进来的包是环路上绕回来的副本，直接丢弃
+        if in_port in self.route.adj.get(datapath.id, {}).values() and \
+                in_port not in self.bcast_rules.get(datapath.id, ()):
+
+            return
+
+        #已经按生成树下发了广播组表时交给组表转发，in_port为真实入端口，组表不会再从入端口发回；
+        #还没有端口信息时退回OFPP_FLOOD；帧缓存在交换机上时按buffer_id发出，不再回传数据
+        if datapath.id in self.flood_ports:
+
+            out = self._build_packet_out(
+                datapath, msg.buffer_id, in_port, None, msg.data,
+                [parser.OFPActionGroup(BROADCAST_GROUP_ID)])
+
+        else:
+
+            out = self._build_packet_out(datapath, msg.buffer_id, in_port,
+
+                                         ofproto.OFPP_FLOOD, msg.data)
+
+        #广播消息的datapath，对应协议，协议解析器，消息结构设置
+
+        datapath.send_msg(out)
+
+        if msg.buffer_id != ofproto.OFP_NO_BUFFER:
+
+            self.buffer_pending = False
+
+        #下发给交换机
+
+        self.metrics.inc('flood_total', datapath.id)
+
+        self.logger.debug("Flooding msg")
+
+    #按生成树更新各交换机的广播组表：主机端口和树上的链路端口都转发，不在树上的链路端口不转发，
+    #环路拓扑中广播不会在环上循环；拓扑或端口变化时调用，只有出端口变化的交换机才重新下发
+    def update_broadcast(self):
+
+        tree = self.route.spanning_tree()
+
+        for dpid, datapath in list(self.datapaths.items()):
+
+            ports = getattr(datapath, 'ports', None)
+
+            if not self.owns(dpid) or ports is None:
+
+                continue
+
+            ofproto = datapath.ofproto
+
+            parser = datapath.ofproto_parser
+
+            links = set(self.route.adj.get(dpid, {}).values())
+
+            tree_ports = tree.get(dpid, set())
+
+            flood = tuple(sorted(port for port in ports
+                                 if port <= ofproto.OFPP_MAX and
+                                 (port not in links or port in tree_ports)))
+
+            old = self.flood_ports.get(dpid)
+
+            #重启后与快照中的广播组表比较，没有变化时不重新下发
+            if old is None:
+
+                old = self.restored_flood.get(dpid)
+
+            fresh = old is None
+
+            if flood != old:
+
+                buckets = [parser.OFPBucket(0, ofproto.OFPP_ANY,
+                                            ofproto.OFPG_ANY,
+                                            [parser.OFPActionOutput(port)])
+                           for port in flood]
+
+                if fresh:
+
+                    #交换机上可能留有上一次运行的同编号组表，先删除再添加
+                    datapath.send_msg(parser.OFPGroupMod(
+                        datapath, ofproto.OFPGC_DELETE, 0, BROADCAST_GROUP_ID))
+
+                    command = ofproto.OFPGC_ADD
+
+                else:
+
+                    command = ofproto.OFPGC_MODIFY
+
+                datapath.send_msg(parser.OFPGroupMod(
+                    datapath, command, ofproto.OFPGT_ALL, BROADCAST_GROUP_ID,
+                    buckets))
+
+                self.logger.info("broadcast group on s%s: ports=%s",
+                                 dpid, flood)
+
+            self.flood_ports[dpid] = flood
+
+            self.update_broadcast_rules(datapath, tree_ports & links, fresh)
+
+        self.flows.flush()
+
+    #从树上链路端口进入的广播由交换机直接交给广播组表，不再上送控制器；
+    #fresh为True表示组表刚刚重建，删除组表时交换机已经删掉了引用它的规则
+    def update_broadcast_rules(self, datapath, ports, fresh):
+
+        dpid = datapath.id
+
+        ofproto = datapath.ofproto
+
+        parser = datapath.ofproto_parser
+
+        rules = self.bcast_rules.setdefault(dpid, set())
+
+        if fresh:
+
+            for port in rules:
+
+                self.flows.removed(dpid, 2, parser.OFPMatch(
+                    in_port=port, eth_dst='ff:ff:ff:ff:ff:ff'))
+
+            rules.clear()
+
+        for port in rules - ports:
+
+            match = parser.OFPMatch(in_port=port, eth_dst='ff:ff:ff:ff:ff:ff')
+
+            mod = parser.OFPFlowMod(datapath=datapath,
+                                    command=ofproto.OFPFC_DELETE_STRICT,
+                                    priority=2, out_port=ofproto.OFPP_ANY,
+                                    out_group=ofproto.OFPG_ANY, match=match)
+
+            self.flows.delete(datapath, mod, match, 2)
+
+        for port in ports - rules:
+
+            actions = [parser.OFPActionGroup(BROADCAST_GROUP_ID)]
+
+            self.add_flow(datapath, 'bcast', 2, parser.OFPMatch(
+                in_port=port, eth_dst='ff:ff:ff:ff:ff:ff'), actions)
+
+        self.bcast_rules[dpid] = set(ports)
+
+
+    #ARP转发函数
+    def arp_forwarding(self, msg, src_ip, dst_ip, eth_pkt):
+
+        datapath = msg.datapath
+
+        parser = datapath.ofproto_parser
+
+        in_port = msg.match['in_port']
+
+        out_port = self.mac_to_port.get(datapath.id, eth_pkt.dst)
+
+        #交换机，协议解析器，入端口，出端口（来自于映射表中的目的地址）
+
+        #如果出端口在映射表中，则转发
+
+        if out_port is not None:
+
+            match = parser.OFPMatch(in_port=in_port, eth_dst=eth_pkt.dst,
+
+                                    eth_type=eth_pkt.ethertype)
+
+            actions = [parser.OFPActionOutput(out_port)]
+
+            self.add_flow(datapath, 'l2', 1, match, actions)
+
+            self.send_packet_out(datapath, msg.buffer_id, in_port,
+
+                                 out_port, msg.data)
+
+            self.logger.debug("Reply ARP to knew host")
+
+             #匹配域，动作，packetout消息下发，提供转发规则
+
+        else:
+
+            #因为找不到所以广播
+
+            self.flood(msg)
+
+
+    #ARP代理：请求的目标IP在主机表中时由控制器构造ARP应答并从入端口发回
+    def arp_proxy(self, msg, in_port, arp_pkt):
+
+        if arp_pkt.opcode != arp.ARP_REQUEST or arp_pkt.src_ip == arp_pkt.dst_ip:
+
+            return False
+
+        target = self.hosts.get(arp_pkt.dst_ip)
+
+        if target is None and self.shared_host(ip=arp_pkt.dst_ip):
+
+            target = self.hosts.get(arp_pkt.dst_ip)
+
+        if target is None:
+
+            return False
+
+        datapath = msg.datapath
+
+        #请求从交换机互联端口进入说明是其它交换机转发的副本，源交换机已经应答过，直接丢弃
+
+        if self.route.is_link_port(datapath.id, in_port):
+
+            return True
+
+        ofproto = datapath.ofproto
+
+        pkt = packet.Packet()
+
+        pkt.add_protocol(ethernet.ethernet(ethertype=ether.ETH_TYPE_ARP,
+
+                                           dst=arp_pkt.src_mac,
+
+                                           src=target.mac))
+
+        pkt.add_protocol(arp.arp(opcode=arp.ARP_REPLY,
+
+                                 src_mac=target.mac, src_ip=arp_pkt.dst_ip,
+
+                                 dst_mac=arp_pkt.src_mac,
+
+                                 dst_ip=arp_pkt.src_ip))
+
+        pkt.serialize()
+
+        self.send_packet_out(datapath, ofproto.OFP_NO_BUFFER,
+
+                             ofproto.OFPP_CONTROLLER, in_port, pkt.data)
+
+        self.logger.debug("ARP proxy reply %s is-at %s", arp_pkt.dst_ip,
+
+                          target.mac)
+
+        return True
+
+    #NDP代理：邻居请求的目标地址在主机表中时由控制器构造邻居通告（Solicited|Override）并从入端口发回，
+    #与ARP代理共用主机表作为邻居缓存
+    def ndp_proxy(self, msg, in_port, eth):
+
+        ndp = eth.ndp
+
+        if ndp.type != fastpkt.ND_NEIGHBOR_SOLICIT or eth.ipv6.src == '::':
+
+            return False
+
+        target = self.hosts.get(ndp.target)
+
+        if target is None and self.shared_host(ip=ndp.target):
+
+            target = self.hosts.get(ndp.target)
+
+        if target is None or target.mac == eth.src:
+
+            return False
+
+        datapath = msg.datapath
+
+        #请求从交换机互联端口进入说明是其它交换机转发的副本，源交换机已经应答过，直接丢弃
+
+        if self.route.is_link_port(datapath.id, in_port):
+
+            return True
+
+        ofproto = datapath.ofproto
+
+        pkt = packet.Packet()
+
+        pkt.add_protocol(ethernet.ethernet(ethertype=ether.ETH_TYPE_IPV6,
+
+                                           dst=eth.src, src=target.mac))
+
+        pkt.add_protocol(ipv6.ipv6(nxt=inet.IPPROTO_ICMPV6, hop_limit=255,
+
+                                   src=ndp.target, dst=eth.ipv6.src))
+
+        pkt.add_protocol(icmpv6.icmpv6(
+
+            type_=icmpv6.ND_NEIGHBOR_ADVERT,
+
+            data=icmpv6.nd_neighbor(
+
+                res=3, dst=ndp.target,
+
+                option=icmpv6.nd_option_tla(hw_src=target.mac))))
+
+        pkt.serialize()
+
+        self.send_packet_out(datapath, ofproto.OFP_NO_BUFFER,
+
+                             ofproto.OFPP_CONTROLLER, in_port, pkt.data)
+
+        self.logger.debug("NDP proxy advert %s is-at %s", ndp.target,
+
+                          target.mac)
+
+        return True
+
+    #地址学习，传参有交换机id，源地址，入端口
+    def mac_learning(self, dpid, src_mac, in_port):
+
+        old_port = self.mac_to_port.get(dpid, src_mac)
+
+        #把源地址与该交换机的入端口匹配，返回值表示匹配是否成功
+
+        if old_port is not None and old_port != in_port:
+
+            #从互联端口进入，或者没有拓扑信息且刚学习过，认为是环路中的广播副本
+
+            if self.route.is_link_port(dpid, in_port) or (
+
+                    not self.route.adj.get(dpid) and
+
+                    self.mac_to_port.age(dpid, src_mac) < MAC_MOVE_HOLD):
+
+                return False
+
+            #主机迁移：删除旧表项以及依赖它的流表
+
+            self.logger.info("host %s moved on s%s: port %s -> %s", src_mac,
+
+                             dpid, old_port, in_port)
+
+            self.invalidate_host(src_mac)
+
+        self.mac_to_port.learn(dpid, src_mac, in_port)
+
+        return True
+
+    #删除所有交换机上该主机的mac表项、发往/来自该主机的流表，以及按路由记录的主机对
+    def invalidate_host(self, mac):
+
+        for dpid, datapath in self.datapaths.items():
+
+            self.mac_to_port.remove(dpid, mac)
+
+            if not self.owns(dpid):
+
+                continue
+
+            parser = datapath.ofproto_parser
+
+            self.del_flows(datapath, parser.OFPMatch(eth_dst=mac))
+
+            self.del_flows(datapath, parser.OFPMatch(eth_src=mac))
+
+        for hosts in self.installed_pairs.values():
+
+            for pair in [p for p in hosts if mac in p]:
+
+                hosts.discard(pair)
+
+    #发送组表消息（用于控制负载均衡），每个出端口对应一个bucket，权重缺省时平均分配
+
+    def send_group_mod(self, datapath, group_id, ports, weights=None,
+
+                       command=None):
+
+        start = time.perf_counter()
+
+        ofproto = datapath.ofproto
+
+        ofp_parser = datapath.ofproto_parser
+
+        #协议以及协议解析器
+
+        watch_group = ofproto_v1_3.OFPQ_ALL
+
+        if weights is None:
+
+            weights = (100 // len(ports),) * len(ports)
+
+        if command is None:
+
+            command = ofproto.OFPGC_ADD
+
+        buckets = []
+
+        for port, weight in zip(ports, weights):
+
+            #每个bucket都让流量入队后从对应端口转发，并监视该端口：
+            #端口断开时交换机自己把流量分到其余存活的bucket上，不必等控制器
+            watch_port = port
+
+            actions = [ofp_parser.OFPActionSetQueue(0),
+
+                       ofp_parser.OFPActionOutput(port)]
+
+            buckets.append(ofp_parser.OFPBucket(weight, watch_port,
+
+                                                watch_group, actions))
+
+        req = ofp_parser.OFPGroupMod(datapath, command,
+
+                                     ofproto.OFPGT_SELECT, group_id, buckets)
+
+        datapath.send_msg(req)
+
+        self.groups.set_weights(datapath.id, group_id, tuple(weights))
+
+        self.metrics.inc('group_mod_total', datapath.id,
+                         ('add', 'modify', 'delete')[command])
+
+        self.metrics.observe('group_mod_seconds', time.perf_counter() - start,
+                             datapath.id)
+
+        #下发组表规则
+
+    #为一组出端口取组表编号：出端口相同的路由共用一个组表，没有时分配编号并下发
+    def get_group(self, datapath, ports):
+
+        group_id = self.groups.lookup(datapath.id, ports)
+
+        if group_id is None:
+
+            group_id = self.groups.allocate(datapath.id, ports)
+
+            self.send_group_mod(datapath, group_id, ports)
+
+            self.logger.info("send_group_mod to s%s ports=%s",
+
+                             datapath.id, ports)
+
+        return group_id
+
+    #删除不再被任何流表引用的组表；组表描述对账或快照对账还没完成的交换机先不清理
+    def sweep_groups(self, datapath):
+
+        dpid = datapath.id
+
+        if dpid in self.verifying or dpid in self.reconciling:
+
+            return
+
+        ofproto = datapath.ofproto
+
+        parser = datapath.ofproto_parser
+
+        unused = self.groups.sweep(dpid, self.flows.installed.get(dpid, {}))
+
+        for group_id in unused:
+
+            datapath.send_msg(parser.OFPGroupMod(datapath, ofproto.OFPGC_DELETE,
+                                                 ofproto.OFPGT_SELECT,
+                                                 group_id))
+
+            self.groups.remove(dpid, group_id)
+
+            self.metrics.inc('group_mod_total', dpid, 'delete')
+
+        if unused:
+
+            self.logger.info("deleted unused groups on s%s: %s", dpid, unused)
+
+    #后台统计线程
+    def _monitor(self):
+
+        while True:
+
+            for datapath in list(self.datapaths.values()):
+
+                if self.owns(datapath.id):
+
+                    self._request_stats(datapath)
+
+                    self.sweep_groups(datapath)
+
+            #顺便清理老化的mac表项和主机，以及快照恢复后一直没有重新发现的链路
+
+            self.mac_to_port.expire()
+
+            self.expire_hosts()
+
+            if self.restored_links and time.time() > self.links_deadline:
+
+                self.expire_restored_links()
+
+            hub.sleep(MONITOR_INTERVAL)
+
+    def _request_stats(self, datapath):
+
+        ofproto = datapath.ofproto
+
+        parser = datapath.ofproto_parser
+
+        req = parser.OFPPortStatsRequest(datapath, 0, ofproto.OFPP_ANY)
+
+        datapath.send_msg(req)
+
+        #有组表或者固定了大流的交换机还要请求流统计，用于大流识别
+        if self.groups.ports.get(datapath.id) or self.pinned.get(datapath.id):
+
+            req = parser.OFPFlowStatsRequest(datapath, 0, ofproto.OFPTT_ALL,
+                                             ofproto.OFPP_ANY,
+                                             ofproto.OFPG_ANY)
+
+            datapath.send_msg(req)
+
+    #端口统计回复：按交换机上报的统计时长计算发送速率与利用率，然后调整该交换机的组表权重
+    @set_ev_cls(ofp_event.EventOFPPortStatsReply, MAIN_DISPATCHER)
+
+    def port_stats_reply_handler(self, ev):
+
+        dpid = ev.msg.datapath.id
+
+        stats = self.port_stats.setdefault(dpid, {})
+
+        port_util = self.port_util.setdefault(dpid, {})
+
+        capacity = LINK_BANDWIDTH * 1000000 / 8.0
+
+        for stat in ev.msg.body:
+
+            now = stat.duration_sec + stat.duration_nsec / 1e9
+
+            last = stats.get(stat.port_no)
+
+            stats[stat.port_no] = (stat.tx_bytes, now)
+
+            if last is None or now <= last[1] or stat.tx_bytes < last[0]:
+
+                continue
+
+            util = (stat.tx_bytes - last[0]) / (now - last[1]) / capacity
+
+            util = min(util, 1.0)
+
+            old = port_util.get(stat.port_no)
+
+            if old is not None:
+
+                util = UTIL_ALPHA * util + (1 - UTIL_ALPHA) * old
+
+            port_util[stat.port_no] = util
+
+        if MULTIPATH_MODE == 'adaptive':
+
+            self.rebalance_groups(ev.msg.datapath)
+
+    #按各出端口的剩余带宽重新计算bucket权重，变化超过滞回阈值时才修改组表
+    def rebalance_groups(self, datapath):
+
+        dpid = datapath.id
+
+        port_util = self.port_util.get(dpid, {})
+
+        current = self.groups.weights.get(dpid, {})
+
+        for group_id, ports in list(self.groups.ports.get(dpid, {}).items()):
+
+            spare = [max(1.0 - port_util.get(port, 0.0), 0.05) for port in ports]
+
+            total = sum(spare)
+
+            weights = tuple(max(int(round(100 * x / total)), 1) for x in spare)
+
+            old = current.get(group_id)
+
+            if old is not None and max(abs(a - b) for a, b in
+
+                                       zip(weights, old)) < WEIGHT_HYSTERESIS:
+
+                continue
+
+            self.send_group_mod(datapath, group_id, ports, weights,
+
+                                datapath.ofproto.OFPGC_MODIFY)
+
+            self.logger.info("rebalance group %s on s%s: %s", group_id,
+
+                             dpid, weights)
+
+    #老化或因主机表满被淘汰的主机：丢弃含有它们的主机对，按路由下发过的流表一并删除，前缀规则随之更新
+    def expire_hosts(self):
+
+        expired = set(host.mac for host in self.hosts.expire())
+
+        if not expired:
+
+            return
+
+        routed = set()
+
+        for hosts in self.installed_pairs.values():
+
+            for member in [m for m in hosts
+                           if m[0] in expired or m[1] in expired]:
+
+                hosts.discard(member)
+
+                routed.update(mac for mac in member[:2] if mac in expired)
+
+        for mac in routed:
+
+            self.invalidate_host(mac)
+
+        self.update_prefixes()
+
+        self.flows.flush()
+
+        self.logger.info("expired %d hosts", len(expired))
+
+    #主机位置学习：只在非交换机互联端口上记录主机，并把该交换机登记为边缘交换机
+    def host_learning(self, dpid, src_mac, in_port, src_ip=None):
+
+        if self.route.is_link_port(dpid, in_port):
+
+            return
+
+        old = self.hosts.locate(src_mac)
+
+        new_ip = src_ip is not None and self.hosts.get(src_ip) is None
+
+        moved = self.hosts.learn(src_mac, dpid, in_port, src_ip)
+
+        #本实例交换机上学到的新主机/新位置发布给其它实例
+        if self.shared is not None and (moved or new_ip) and self.owns(dpid):
+
+            self.shared.publish_host(src_mac, dpid, in_port, src_ip)
+
+        if old is not None and old != (dpid, in_port):
+
+            #主机接到了别的交换机/端口，旧的二层表项与路由流表作废
+
+            self.invalidate_host(src_mac)
+
+        self.route.add_edge(dpid)
+
+        #新主机或主机迁移立即更新前缀规则，否则旧的前缀仍然覆盖它，包不会上送控制器
+        if moved or new_ip:
+
+            self.update_prefixes()
+
+    #按路由引擎预计算的等价路径下发整条路由，返回False表示交给原有的二层转发处理
+    def multipath_forwarding(self, msg, in_port, eth):
+
+        datapath = msg.datapath
+
+        dpid = datapath.id
+
+        if AGGREGATE and eth.ipv4 is not None:
+
+            return self.prefix_forwarding(msg, in_port, eth)
+
+        if self.hosts.locate(eth.dst) is None:
+
+            self.shared_host(mac=eth.dst)
+
+        route = self.install_route(eth.src, eth.dst, eth.ethertype)
+
+        if route is None:
+
+            return False
+
+        hops, dst_dpid, dst_port = route
+
+        #当前交换机不在路由上时（例如泛洪的副本）直接丢弃
+
+        if dpid == dst_dpid:
+
+            out_port = dst_port
+
+        elif dpid in hops:
+
+            out_port = hops[dpid][0]
+
+        else:
+
+            return True
+
+        self.send_packet_out(datapath, msg.buffer_id, in_port,
+
+                             out_port, msg.data)
+
+        return True
+
+    #按前缀规则转发：前缀规则在主机学习时已经下发，这里把这个包从当前交换机朝目的主机发出
+    def prefix_forwarding(self, msg, in_port, eth):
+
+        datapath = msg.datapath
+
+        dpid = datapath.id
+
+        host = self.hosts.get(eth.ipv4.dst)
+
+        if host is None and self.shared_host(ip=eth.ipv4.dst):
+
+            host = self.hosts.get(eth.ipv4.dst)
+
+        if host is None:
+
+            return False
+
+        if host.dpid == dpid:
+
+            out_port = host.port
+
+        else:
+
+            ports = self.route.next_hops(host.dpid).get(dpid)
+
+            if not ports:
+
+                return False
+
+            out_port = ports[0]
+
+        self.send_packet_out(datapath, msg.buffer_id, in_port,
+
+                             out_port, msg.data)
+
+        return True
+
+    #按当前主机表和拓扑增量更新各交换机的前缀规则：
+    #只处理位置变化的主机，以及朝向其边缘交换机的出端口在该交换机上发生变化的主机；
+    #topology为True表示拓扑变化，重新计算各边缘交换机为终点的最短路
+    def update_prefixes(self, topology=False):
+
+        if not AGGREGATE:
+
+            return
+
+        hosts = {}
+
+        for ip, host in self.hosts.by_ip.items():
+
+            if ':' not in ip:
+
+                hosts[ip_to_int(ip)] = (host.dpid, host.port)
+
+        old_hosts = self.prefix_hosts
+
+        self.prefix_hosts = hosts
+
+        changed = set(ip for ip in set(hosts) | set(old_hosts)
+                      if hosts.get(ip) != old_hosts.get(ip))
+
+        old_hops = self.prefix_hops
+
+        hops = self.prefix_hops = {}
+
+        for edge, _ in hosts.values():
+
+            if edge in hops:
+
+                continue
+
+            if topology or edge not in old_hops:
+
+                hops[edge] = self.route.next_hops(edge)
+
+            else:
+
+                hops[edge] = old_hops[edge]
+
+        for dpid, datapath in list(self.datapaths.items()):
+
+            if not self.owns(dpid):
+
+                continue
+
+            table = self.prefix_tables.get(dpid)
+
+            if table is None:
+
+                table = self.prefix_tables[dpid] = PrefixTable()
+
+                #交换机刚连上：删除上次运行留下的IPv4规则，避免与新的前缀规则重叠
+                self.del_flows(datapath, datapath.ofproto_parser.OFPMatch(
+                    eth_type=ether.ETH_TYPE_IP))
+
+                ips = set(hosts)
+
+            else:
+
+                moved = set(edge for edge in hops
+                            if hops[edge].get(dpid) !=
+                            old_hops.get(edge, {}).get(dpid))
+
+                ips = changed | set(ip for ip, (edge, _) in hosts.items()
+                                    if edge in moved)
+
+            changes = {}
+
+            for ip in ips:
+
+                changes[ip] = None
+
+                if ip not in hosts:
+
+                    continue
+
+                edge, port = hosts[ip]
+
+                changes[ip] = (port,) if edge == dpid else \
+                    hops[edge].get(dpid)
+
+            added, removed = table.update(changes)
+
+            self.install_prefixes(datapath, added, removed)
+
+    #下发前缀规则的变化：新增或出端口改变的前缀直接覆盖，消失的前缀严格删除
+    def install_prefixes(self, datapath, added, removed):
+
+        dpid = datapath.id
+
+        ofproto = datapath.ofproto
+
+        parser = datapath.ofproto_parser
+
+        for prefix, prefix_len in removed:
+
+            match = parser.OFPMatch(eth_type=ether.ETH_TYPE_IP,
+                                    ipv4_dst=(int_to_ip(prefix),
+                                              prefix_mask(prefix_len)))
+
+            mod = parser.OFPFlowMod(datapath=datapath,
+                                    command=ofproto.OFPFC_DELETE_STRICT,
+                                    priority=3, out_port=ofproto.OFPP_ANY,
+                                    out_group=ofproto.OFPG_ANY, match=match)
+
+            self.flows.delete(datapath, mod, match, 3)
+
+            self.groups.release(dpid, (3, match_key(match)))
+
+        for (prefix, prefix_len), ports in added.items():
+
+            match = parser.OFPMatch(eth_type=ether.ETH_TYPE_IP,
+                                    ipv4_dst=(int_to_ip(prefix),
+                                              prefix_mask(prefix_len)))
+
+            key = (3, match_key(match))
+
+            if len(ports) == 1:
+
+                actions = [parser.OFPActionOutput(ports[0])]
+
+                self.groups.release(dpid, key)
+
+            else:
+
+                group_id = self.get_group(datapath, ports)
+
+                actions = [parser.OFPActionGroup(group_id=group_id)]
+
+                self.groups.ref(dpid, key, group_id)
+
+            self.add_flow(datapath, 'prefix', 3, match, actions)
+
+        if added or removed:
+
+            self.logger.debug("prefix rules on s%s: %d (+%d -%d)", dpid,
+                              len(self.prefix_tables[dpid].rules),
+                              len(added), len(removed))
+
+    #为一对主机下发整条路由，返回 (每一跳的出端口, 目的交换机, 目的端口)，主机位置未知或不可达时返回None
+    def install_route(self, src_mac, dst_mac, eth_type):
+
+        src = self.hosts.locate(src_mac)
+
+        dst = self.hosts.locate(dst_mac)
+
+        if src is None or dst is None:
+
+            return None
+
+        dst_dpid, dst_port = dst
+
+        if src[0] == dst_dpid:
+
+            hops = {}
+
+        else:
+
+            hops = self.route.get_hops(src[0], dst_dpid)
+
+            if hops is None:
+
+                return None
+
+        #已按当前路由下发过的主机对直接返回：路由变化时invalidate_routes、规则超时或被删除时FlowRemoved
+        #会把主机对移出installed_pairs，这里的packet-in只是规则生效前到达的包
+        if (src_mac, dst_mac, eth_type) in \
+                self.installed_pairs.get((src[0], dst_dpid), ()):
+
+            return hops, dst_dpid, dst_port
+
+        #路径上的每个交换机：单出口直接转发，多出口通过SELECT组表分担
+        #多实例时只下发本实例负责的交换机，其余交换机在包到达时由其MASTER实例下发
+
+        for node, ports in hops.items():
+
+            node_dp = self.datapaths.get(node)
+
+            if node_dp is None or not self.owns(node):
+
+                continue
+
+            node_parser = node_dp.ofproto_parser
+
+            match = node_parser.OFPMatch(eth_type=eth_type,
+
+                                         eth_src=src_mac, eth_dst=dst_mac)
+
+            key = (3, match_key(match))
+
+            if len(ports) == 1:
+
+                actions = [node_parser.OFPActionOutput(ports[0])]
+
+                self.groups.release(node, key)
+
+            else:
+
+                group_id = self.get_group(node_dp, ports)
+
+                actions = [node_parser.OFPActionGroup(group_id=group_id)]
+
+                self.groups.ref(node, key, group_id)
+
+            self.add_flow(node_dp, 'route', 3, match, actions)
+
+        #目的交换机直接转发给主机
+
+        dst_dp = self.datapaths.get(dst_dpid)
+
+        if dst_dp is not None and self.owns(dst_dpid):
+
+            dst_parser = dst_dp.ofproto_parser
+
+            match = dst_parser.OFPMatch(eth_type=eth_type,
+
+                                        eth_src=src_mac, eth_dst=dst_mac)
+
+            self.add_flow(dst_dp, 'route', 3, match,
+
+                          [dst_parser.OFPActionOutput(dst_port)])
+
+        self.installed_pairs.setdefault((src[0], dst_dpid), set()).add(
+
+            (src_mac, dst_mac, eth_type))
+
+        return hops, dst_dpid, dst_port
+
+    #链路故障后立即按新路由重新下发受影响的主机对，不等下一个packet-in
+    def reroute(self, changed):
+
+        members = []
+
+        for pair in changed:
+
+            members.extend(self.installed_pairs.get(pair, ()))
+
+        self.invalidate_routes(changed)
+
+        for src_mac, dst_mac, eth_type in members:
+
+            self.install_route(src_mac, dst_mac, eth_type)
+
+        self.flows.flush()
+
+        if members:
+
+            self.logger.info("rerouted %d host pairs", len(members))
+
+    #端口断开：交换机上的组表已经按watch_port把流量切到其它bucket，
+    #控制器再从拓扑中删除该链路，只重算并重新下发经过它的主机对
+    #端口增删都会改变广播组表的出端口（datapath.ports由ofp_handler随端口状态更新）
+    @set_ev_cls(ofp_event.EventOFPPortStatus, MAIN_DISPATCHER)
+    def port_status_handler(self, ev):
+
+        msg = ev.msg
+
+        datapath = msg.datapath
+
+        ofproto = datapath.ofproto
+
+        desc = msg.desc
+
+        dpid = datapath.id
+
+        if msg.reason == ofproto.OFPPR_DELETE or (
+                desc.state & ofproto.OFPPS_LINK_DOWN or
+                desc.config & ofproto.OFPPC_PORT_DOWN):
+
+            for nbr, port in list(self.route.adj.get(dpid, {}).items()):
+
+                if port == desc.port_no:
+
+                    self.logger.info("port %s of s%s down, link to s%s removed",
+                                     port, dpid, nbr)
+
+                    self.reroute(self.route.remove_link(dpid, nbr))
+
+        self.update_broadcast()
+
+    #路由变化后删除按旧路由下发的流表，下一个packet-in会按新路由重新下发
+    def invalidate_routes(self, changed):
+
+        for pair, old_hops in changed.items():
+
+            #出端口没有变化（例如重新发现了快照中恢复的链路）时保留按原路由下发的流表
+            if old_hops == self.route.get_hops(pair[0], pair[1]):
+
+                continue
+
+            hosts = self.installed_pairs.pop(pair, None)
+
+            if not hosts:
+
+                continue
+
+            nodes = set(old_hops or ()) | set([pair[1]])
+
+            for node in nodes:
+
+                datapath = self.datapaths.get(node)
+
+                if datapath is None or not self.owns(node):
+
+                    continue
+
+                parser = datapath.ofproto_parser
+
+                for src_mac, dst_mac, eth_type in hosts:
+
+                    match = parser.OFPMatch(eth_src=src_mac, eth_dst=dst_mac)
+
+                    self.del_flows(datapath, match)
+
+            self.logger.info("route s%s -> s%s changed", pair[0], pair[1])
+
+        #拓扑变化立即改写朝向受影响边缘交换机的前缀规则
+        self.update_prefixes(topology=True)
+
+        self.flows.flush()
+
+    #快照恢复的链路被重新发现
+    def confirm_link(self, src, src_port, dst, dst_port):
+
+        self.restored_links.discard((src, src_port, dst, dst_port))
+
+        self.restored_links.discard((dst, dst_port, src, src_port))
+
+    #期限内没有重新发现的恢复链路已经不存在，从拓扑中删除
+    def expire_restored_links(self):
+
+        for src, src_port, dst, dst_port in self.restored_links:
+
+            if self.route.adj.get(src, {}).get(dst) == src_port:
+
+                self.invalidate_routes(self.route.remove_link(src, dst))
+
+        self.logger.info("dropped %d restored links not rediscovered",
+                         len(self.restored_links))
+
+        self.restored_links.clear()
+
+        self.update_broadcast()
+
+    #链路发现事件：交换机加入/离开，链路增加/删除
+
+    @set_ev_cls(topo_event.EventSwitchEnter)
+
+    def switch_enter_handler(self, ev):
+
+        self.route.add_switch(ev.switch.dp.id)
+
+        self.update_broadcast()
+
+    @set_ev_cls(topo_event.EventSwitchLeave)
+
+    def switch_leave_handler(self, ev):
+
+        self.invalidate_routes(self.route.remove_switch(ev.switch.dp.id))
+
+        self.update_broadcast()
+
+    @set_ev_cls(topo_event.EventLinkAdd)
+
+    def link_add_handler(self, ev):
+
+        src = ev.link.src
+
+        dst = ev.link.dst
+
+        #链路端口上误学习到的主机位置需要清除
+
+        self.hosts.remove_port(src.dpid, src.port_no)
+
+        self.hosts.remove_port(dst.dpid, dst.port_no)
+
+        self.confirm_link(src.dpid, src.port_no, dst.dpid, dst.port_no)
+
+        #本实例只收到自己交换机上的LLDP，发现的链路发布给其它实例
+        if self.shared is not None:
+
+            self.shared.publish_link(src.dpid, src.port_no,
+                                     dst.dpid, dst.port_no)
+
+        self.invalidate_routes(self.route.add_link(src.dpid, src.port_no,
+
+                                                   dst.dpid, dst.port_no))
+
+        self.update_broadcast()
+
+    @set_ev_cls(topo_event.EventLinkDelete)
+
+    def link_delete_handler(self, ev):
+
+        src = ev.link.src
+
+        dst = ev.link.dst
+
+        if self.shared is not None:
+
+            self.shared.publish_link(src.dpid, src.port_no,
+                                     dst.dpid, dst.port_no, alive=False)
+
+        self.invalidate_routes(self.route.remove_link(ev.link.src.dpid,
+
+                                                      ev.link.dst.dpid))
+
+        self.update_broadcast()
+
+    #包的处理程序，分为ipv4包和ipv6包
+    @set_ev_cls(ofp_event.EventOFPPacketIn, MAIN_DISPATCHER)
+
+    def _packet_in_handler(self, ev):
+
+        start = time.perf_counter()
+
+        msg = ev.msg
+
+        #交换机缓存了整帧时msg.data只有帧头，处理过程中的packet-out按buffer_id引用缓存
+        self.buffer_pending = msg.buffer_id != msg.datapath.ofproto.OFP_NO_BUFFER
+
+        #快速解码只读取以太网头以及ARP/IPv4/IPv6中用到的字段，不再构造完整的packet.Packet
+        eth = fastpkt.decode(msg.data)
+
+        if eth is None:
+
+            kind = 'undecoded'
+
+        else:
+
+            kind = ('arp' if eth.arp is not None else
+                    'ipv4' if eth.ipv4 is not None else
+                    'ipv6' if eth.ipv6 is not None else 'other')
+
+            self.packet_in_processing(ev, eth)
+
+        if self.buffer_pending:
+
+            self.release_buffer(msg)
+
+        #本次packet-in产生的流表修改一次性下发，每个交换机一个barrier
+
+        self.flows.flush()
+
+        self.metrics.observe('packet_in_seconds', time.perf_counter() - start,
+                             ev.msg.datapath.id, kind)
+
+    #导出指标前刷新各交换机流表占用、缓存计数以及表项数
+    def collect_metrics(self):
+
+        for dpid in self.datapaths:
+
+            self.metrics.set('flow_table_entries', self.flows.occupancy(dpid),
+                             dpid)
+
+            self.metrics.set('groups', len(self.groups.ports.get(dpid, ())),
+                             dpid)
+
+        for event, value in self.flows.stats.items():
+
+            self.metrics.set('flow_cache_total', value, event)
+
+        self.metrics.set('mac_table_entries', len(self.mac_to_port))
+
+        self.metrics.set('hosts', len(self.hosts.by_mac))
+
+        self.metrics.set('elephants_pinned',
+                         sum(len(p) for p in self.pinned.values()))
+
+    def packet_in_processing(self, ev, eth):
+
+        msg = ev.msg
+
+        datapath = msg.datapath
+
+        dpid = datapath.id
+
+        parser = datapath.ofproto_parser
+
+        in_port = msg.match['in_port']
+
+        arp_pkt = eth.arp
+
+        ip_pkt = eth.ipv4
+
+        ip_pkt_6 = eth.ipv6
+
+        #消息，交换机，交换机id，协议解析器，入端口，以太网头，arp头，ip4头，ipv6头
+
+        #如果是arp包，则采用含有arp的规则
+        if arp_pkt is not None:
+
+            self.logger.debug("ARP processing")
+
+            self.host_learning(dpid, eth.src, in_port, arp_pkt.src_ip)
+
+            #目标主机已知时由控制器直接应答，不再向外转发
+
+            if self.arp_proxy(msg, in_port, arp_pkt):
+
+                return
+
+            if self.mac_learning(dpid, eth.src, in_port) is False:
+
+                self.logger.debug("ARP packet enter in different ports")
+
+                return
+
+
+
+            self.arp_forwarding(msg, arp_pkt.src_ip, arp_pkt.dst_ip, eth)
+
+        #如果是ipv4或ipv6包，则采用含有ip协议的规则，两者的转发方式相同
+        ip = ip_pkt if ip_pkt is not None else ip_pkt_6
+
+        if ip is not None:
+
+            self.logger.debug("IP processing")
+
+            #重复地址检测（DAD）的源地址为::，不记录
+            self.host_learning(dpid, eth.src, in_port,
+                               ip.src if ip.src != '::' else None)
+
+            #邻居请求的目标地址已知时由控制器直接应答，不再向外泛洪
+
+            if eth.ndp is not None and self.ndp_proxy(msg, in_port, eth):
+
+                return
+
+            #源、目的主机位置都已知时按多路径路由转发
+
+            if self.multipath_forwarding(msg, in_port, eth):
+
+                return
 
-               else:
+            #如果以太网的目的地址在映射表中存在则按二层转发
+            out_port = self.mac_to_port.get(dpid, eth.dst)
 
-                    #普通交换机的普通流
+            if out_port is not None:
 
-                    out_port = self.mac_to_port[dpid][eth.dst]
+                #普通交换机的普通流
 
-                    actions = [parser.OFPActionOutput(out_port)]
+                actions = [parser.OFPActionOutput(out_port)]
 
-                    match = parser.OFPMatch(in_port=in_port, eth_dst=eth.dst,
+                match = parser.OFPMatch(in_port=in_port, eth_dst=eth.dst,
 
-                                            eth_type=eth.ethertype)
+                                        eth_type=eth.ethertype)
 
-                    self.add_flow(datapath, 0, 1, match, actions)
+                self.add_flow(datapath, 'l2', 1, match, actions)
 
-                    self.send_packet_out(datapath, msg.buffer_id, in_port,
+                self.send_packet_out(datapath, msg.buffer_id, in_port,
 
-                                         out_port, msg.data)
+                                     out_port, msg.data)
 
             else:
 
                 if self.mac_learning(dpid, eth.src, in_port) is False:
 
-                    self.logger.debug("IPV4 packet enter in different ports")
+                    self.logger.debug("IP packet enter in different ports")
 
                     return
 
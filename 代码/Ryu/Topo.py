@@ -8,9 +8,40 @@ from mininet.topo import Topo
 import time
 import logging
 import os
+import sys
 
+#mn --custom执行本文件时既不设置__file__，也不把所在目录加入sys.path
+try:
+	sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+except NameError:
+	sys.path.insert(0, os.getcwd())
 
-def multiControllerNet(con_num=1, sw_num=11, host_num=4):
+import diamond
+
+
+#按diamond.py中的定义连接交换机和主机，node可以是Topo或Mininet，两者的addLink参数相同
+def addDiamondLinks(node, switches, hosts, bw=10):
+	for n, sw, port in diamond.host_links(len(hosts)):
+		node.addLink(switches[sw], hosts[n-1], port, bw=bw)
+	for a, pa, b, pb in diamond.LINKS:
+		node.addLink(switches[a], switches[b], pa, pb, bw=bw)
+
+
+#与multiControllerNet相同的菱形拓扑（s1接h1，s10接h2-h4），供 mn --custom 或基准测试用 Mininet(topo=...) 启动
+class DiamondTopo(Topo):
+
+	def __init__(self, sw_num=diamond.SWITCHES, host_num=4, bw=10):
+		Topo.__init__(self)
+		s = [self.addSwitch('s%d' % n) for n in range(sw_num)]
+		h = [self.addHost('h%d' % n) for n in range(1, host_num+1)]
+		addDiamondLinks(self, s, h, bw)
+
+
+#交换机s<n>的dpid为n，按 dpid % con_num 分给各控制器实例，与Ryu.py中的shard_of一致
+#每个交换机同时连接所有控制器，由Ryu实例通过角色请求决定谁是MASTER，实例失效时其它实例接管
+#第i个控制器监听6633+i端口，对应的Ryu实例这样启动：
+#  MULTIPATH_SHARDS=<con_num> MULTIPATH_SHARD=<i> ryu-manager --observe-links --ofp-tcp-listen-port <6633+i> --wsapi-port <8080+i> Ryu.py
+def multiControllerNet(con_num=1, sw_num=diamond.SWITCHES, host_num=4):
 
 	controller_list = []
 	switch_list = []
@@ -18,10 +49,11 @@ def multiControllerNet(con_num=1, sw_num=11, host_num=4):
 	
 	net = Mininet(controller=None, switch=OVSSwitch, link=TCLink)
 	
-	name = 'controller0' 
-	c = net.addController(name, controller=RemoteController,ip='127.0.0.1',port=6633)
-	controller_list.append(c)
-	print("*** Creating %s" % name)
+	for i in xrange(con_num):
+		name = 'controller%d' % i
+		c = net.addController(name, controller=RemoteController,ip='127.0.0.1',port=6633 + i)
+		controller_list.append(c)
+		print("*** Creating %s" % name)
 	
 	print("*** Creating switches")
 	switch_list = [net.addSwitch('s%d' % n) for n in xrange(sw_num)]
@@ -32,30 +64,17 @@ def multiControllerNet(con_num=1, sw_num=11, host_num=4):
 	
 	print("*** Creating links")
 	
-	net.addLink(switch_list[1], host_list[0],1).bw=10
-	net.addLink(switch_list[10], host_list[1],3).bw=10
-	net.addLink(switch_list[10], host_list[2],4).bw=10
-	net.addLink(switch_list[10], host_list[3],5).bw=10
-	net.addLink(switch_list[1], switch_list[2],2,1).bw=10
-	net.addLink(switch_list[1], switch_list[3],3,1).bw=10
-	net.addLink(switch_list[2], switch_list[4],2,1).bw=10
-	net.addLink(switch_list[2], switch_list[5],3,1).bw=10
-	net.addLink(switch_list[3], switch_list[6],2,1).bw=10
-	net.addLink(switch_list[3], switch_list[7],3,1).bw=10
-	net.addLink(switch_list[4], switch_list[8],2,1).bw=10
-	net.addLink(switch_list[5], switch_list[8],2,2).bw=10
-	net.addLink(switch_list[6], switch_list[9],2,1).bw=10
-	net.addLink(switch_list[7], switch_list[9],2,2).bw=10
-	net.addLink(switch_list[8], switch_list[10],3,1).bw=10
-	net.addLink(switch_list[9], switch_list[10],3,2).bw=10
+	addDiamondLinks(net, switch_list, host_list, 10)
 		
 	
 	print("*** Starting network")
 	net.build()
-	c.start()
+	for c in controller_list:
+		c.start()
 	
 	for i in xrange(sw_num):
-		switch_list[i].start([c])
+		switch_list[i].start(controller_list)
+		print("*** s%d -> controller%d" % (i, i % con_num))
 	
 	
 	print("*** Running CLI")
@@ -66,6 +85,9 @@ def multiControllerNet(con_num=1, sw_num=11, host_num=4):
 	
 	net.stop()
 
+topos = {'diamond': DiamondTopo}
+
 if __name__ == '__main__':
 	setLogLevel('info') 
-	multiControllerNet(con_num=1, sw_num=11, host_num=4)
+	con_num = int(sys.argv[1]) if len(sys.argv) > 1 else 1
+	multiControllerNet(con_num=con_num, sw_num=diamond.SWITCHES, host_num=4)
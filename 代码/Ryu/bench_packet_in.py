@@ -0,0 +1,130 @@
+#!/usr/bin/python
+#packet-in解码微基准：比较原来的 packet.Packet + get_protocol 解析与 fastpkt 快速解码每秒能处理的帧数
+#用法：python bench_packet_in.py [抓包文件.pcap] [轮数]，不给抓包文件时使用合成的ARP/IPv4/IPv6帧
+
+import importlib.util
+import socket
+import struct
+import sys
+import time
+
+import fastpkt
+
+
+#合成若干条与实验拓扑中主机之间流量类似的帧
+def synthetic_frames():
+
+    frames = []
+
+    for i in range(1, 5):
+
+        src = struct.pack('!HI', 0, i)
+
+        dst = struct.pack('!HI', 0, i % 4 + 1)
+
+        src_ip = socket.inet_aton('10.0.0.%d' % i)
+
+        dst_ip = socket.inet_aton('10.0.0.%d' % (i % 4 + 1))
+
+        #ARP请求
+        frames.append(b'\xff' * 6 + src + struct.pack('!H', 0x0806) +
+                      struct.pack('!HHBBH6s4s6s4s', 1, 0x0800, 6, 4, 1,
+                                  src, src_ip, b'\x00' * 6, dst_ip))
+
+        #IPv4/UDP，1000字节负载
+        payload = b'\x00' * 1000
+
+        udp = struct.pack('!HHHH', 5001, 5001, 8 + len(payload), 0)
+
+        ip = struct.pack('!BBHHHBBH4s4s', 0x45, 0, 20 + len(udp) +
+                         len(payload), 0, 0, 64, 17, 0, src_ip, dst_ip)
+
+        frames.append(dst + src + struct.pack('!H', 0x0800) + ip + udp +
+                      payload)
+
+        #IPv6/ICMPv6
+        icmp = struct.pack('!BBH', 128, 0, 0) + b'\x00' * 60
+
+        ip6 = struct.pack('!IHBB16s16s', 0x60000000, len(icmp), 58, 64,
+                          socket.inet_pton(socket.AF_INET6, 'fe80::%d' % i),
+                          socket.inet_pton(socket.AF_INET6,
+                                           'fe80::%d' % (i % 4 + 1)))
+
+        frames.append(dst + src + struct.pack('!H', 0x86dd) + ip6 + icmp)
+
+    return frames
+
+
+def pcap_frames(path):
+
+    from ryu.lib import pcaplib
+
+    with open(path, 'rb') as f:
+
+        return [buf for _, buf in pcaplib.Reader(f)]
+
+
+#原来 _packet_in_handler 中的解析过程
+def ryu_parse(data):
+
+    from ryu.lib.packet import packet, ethernet, arp, ipv4, ipv6
+
+    pkt = packet.Packet(data)
+
+    eth = pkt.get_protocols(ethernet.ethernet)[0]
+
+    return (eth, pkt.get_protocol(arp.arp), pkt.get_protocol(ipv4.ipv4),
+            pkt.get_protocol(ipv6.ipv6))
+
+
+def fast_parse(data):
+
+    hdr = fastpkt.decode(data)
+
+    return hdr, hdr.arp, hdr.ipv4, hdr.ipv6
+
+
+def run(name, parse, frames, rounds):
+
+    start = time.perf_counter()
+
+    for _ in range(rounds):
+
+        for data in frames:
+
+            parse(data)
+
+    elapsed = time.perf_counter() - start
+
+    rate = rounds * len(frames) / elapsed
+
+    print('%-8s %10.0f packet-in/s  %8.2f us/packet-in' %
+          (name, rate, 1e6 / rate))
+
+    return rate
+
+
+def main():
+
+    frames = pcap_frames(sys.argv[1]) if len(sys.argv) > 1 else \
+        synthetic_frames()
+
+    rounds = int(sys.argv[2]) if len(sys.argv) > 2 else 2000
+
+    print('%d frames x %d rounds' % (len(frames), rounds))
+
+    fast = run('fastpkt', fast_parse, frames, rounds)
+
+    if importlib.util.find_spec('ryu') is None:
+
+        print('ryu not installed, skip packet.Packet baseline')
+
+        return
+
+    slow = run('ryu', ryu_parse, frames, rounds)
+
+    print('speedup  %.1fx' % (fast / slow))
+
+
+if __name__ == '__main__':
+    main()
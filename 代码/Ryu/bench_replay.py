@@ -0,0 +1,330 @@
+#!/usr/bin/python
+#离线packet-in回放基准：不启动Mininet/OVS，直接实例化MULTIPATH_13，交换机用桩对象代替
+#桩交换机使用真实的ofproto_v1_3_parser构造消息，send_msg只做记录（可选序列化），类似cbench逐个注入packet-in
+#报告每秒处理的事件数、每个事件处理时间的分位数，以及平均每个packet-in产生的flow-mod/group-mod/packet-out数
+#用法：python bench_replay.py [--hosts N] [--rounds N] [--pcap 抓包文件] [--serialize] [--no-topo]
+
+import argparse
+import atexit
+import collections
+import os
+import shutil
+import socket
+import struct
+import tempfile
+import time
+
+#回放时只用一个实例，快照写到临时目录，不读取上次运行的状态，退出时删除该目录
+os.environ['MULTIPATH_SHARDS'] = '1'
+
+SNAPSHOT_DIR = tempfile.mkdtemp()
+
+atexit.register(shutil.rmtree, SNAPSHOT_DIR, True)
+
+os.environ['MULTIPATH_SNAPSHOT_DB'] = os.path.join(SNAPSHOT_DIR, 'snapshot.db')
+
+from ryu.controller import ofp_event
+from ryu.ofproto import ofproto_v1_3
+from ryu.ofproto import ofproto_v1_3_parser
+
+from Ryu import MULTIPATH_13
+
+import diamond
+
+
+class StubDatapath(object):
+
+    def __init__(self, dpid, serialize=False):
+
+        self.id = dpid
+
+        self.ofproto = ofproto_v1_3
+
+        self.ofproto_parser = ofproto_v1_3_parser
+
+        self.xid = 0
+
+        #为True时像真实连接一样把消息编码成字节，计入编码开销
+        self.serialize = serialize
+
+        #按消息类型计数
+        self.sent = collections.Counter()
+
+        #还没有应答的barrier，每个事件处理完后像交换机一样按序应答
+        self.barriers = []
+
+    def set_xid(self, msg):
+
+        self.xid += 1
+
+        msg.set_xid(self.xid)
+
+        return self.xid
+
+    def send_msg(self, msg):
+
+        if msg.xid is None:
+
+            self.set_xid(msg)
+
+        if self.serialize:
+
+            msg.serialize()
+
+        self.sent[msg.__class__.__name__] += 1
+
+        if isinstance(msg, ofproto_v1_3_parser.OFPBarrierRequest):
+
+            self.barriers.append(msg.xid)
+
+
+def host_mac(i):
+
+    return struct.pack('!HI', 0x0200, i)
+
+
+def host_ip(i):
+
+    return socket.inet_aton('10.%d.%d.%d' % (i >> 16 & 0xff, i >> 8 & 0xff,
+                                            i & 0xff))
+
+
+def arp_frame(src, dst, op, src_ip, dst_ip):
+
+    eth_dst = b'\xff' * 6 if op == 1 else dst
+
+    return eth_dst + src + struct.pack('!H', 0x0806) + \
+        struct.pack('!HHBBH6s4s6s4s', 1, 0x0800, 6, 4, op, src, src_ip,
+                    dst if op == 2 else b'\x00' * 6, dst_ip)
+
+
+def ipv4_frame(src, dst, src_ip, dst_ip, size=1000):
+
+    payload = b'\x00' * size
+
+    udp = struct.pack('!HHHH', 5001, 5001, 8 + size, 0)
+
+    ip = struct.pack('!BBHHHBBH4s4s', 0x45, 0, 20 + len(udp) + size, 0, 0,
+                     64, 17, 0, src_ip, dst_ip)
+
+    return dst + src + struct.pack('!H', 0x0800) + ip + udp + payload
+
+
+def ipv6_frame(src, dst, i, j):
+
+    icmp = struct.pack('!BBH', 128, 0, 0) + b'\x00' * 60
+
+    ip6 = struct.pack('!IHBB16s16s', 0x60000000, len(icmp), 58, 64,
+                      socket.inet_pton(socket.AF_INET6, 'fe80::%x' % i),
+                      socket.inet_pton(socket.AF_INET6, 'fe80::%x' % j))
+
+    return dst + src + struct.pack('!H', 0x86dd) + ip6 + icmp
+
+
+#主机i轮流接到各边缘交换机上，端口号从10开始，避开交换机互联端口
+def host_location(i, edges):
+
+    return edges[i % len(edges)], 10 + i // len(edges)
+
+
+#合成的事件流：每对主机依次是ARP请求、ARP应答、IPv4数据包，每隔几对加一个IPv6包
+#返回 [(dpid, 入端口, 帧)]
+def synthetic_stream(hosts, edges):
+
+    stream = []
+
+    for i in range(hosts):
+
+        j = (i * 7 + 1) % hosts
+
+        if i == j:
+
+            continue
+
+        src, dst = host_mac(i), host_mac(j)
+
+        src_ip, dst_ip = host_ip(i + 1), host_ip(j + 1)
+
+        src_loc = host_location(i, edges)
+
+        dst_loc = host_location(j, edges)
+
+        stream.append(src_loc + (arp_frame(src, dst, 1, src_ip, dst_ip),))
+
+        stream.append(dst_loc + (arp_frame(dst, src, 2, dst_ip, src_ip),))
+
+        stream.append(src_loc + (ipv4_frame(src, dst, src_ip, dst_ip),))
+
+        if i % 4 == 0:
+
+            stream.append(src_loc + (ipv6_frame(src, dst, i + 1, j + 1),))
+
+    return stream
+
+
+#抓包文件中的帧按源mac第一次出现的顺序分配到各边缘交换机的主机端口上
+def pcap_stream(path, edges):
+
+    from ryu.lib import pcaplib
+
+    locations = {}
+
+    stream = []
+
+    with open(path, 'rb') as f:
+
+        for _, data in pcaplib.Reader(f):
+
+            src = data[6:12]
+
+            if src not in locations:
+
+                locations[src] = host_location(len(locations), edges)
+
+            stream.append(locations[src] + (data,))
+
+    return stream
+
+
+def build_app(switches, links, serialize):
+
+    app = MULTIPATH_13()
+
+    datapaths = {}
+
+    for dpid in switches:
+
+        datapaths[dpid] = StubDatapath(dpid, serialize)
+
+        app.datapaths[dpid] = datapaths[dpid]
+
+        app.route.add_switch(dpid)
+
+    for src, src_port, dst, dst_port in links:
+
+        app.route.add_link(src, src_port, dst, dst_port)
+
+    return app, datapaths
+
+
+#事件对象预先构造好，计时只包含 _packet_in_handler 本身以及桩交换机的barrier应答
+def build_events(stream, datapaths):
+
+    events = []
+
+    for dpid, in_port, data in stream:
+
+        dp = datapaths[dpid]
+
+        msg = ofproto_v1_3_parser.OFPPacketIn(
+            dp, buffer_id=ofproto_v1_3.OFP_NO_BUFFER, total_len=len(data),
+            reason=ofproto_v1_3.OFPR_NO_MATCH, table_id=0, cookie=0,
+            match=ofproto_v1_3_parser.OFPMatch(in_port=in_port), data=data)
+
+        events.append(ofp_event.EventOFPPacketIn(msg))
+
+    return events
+
+
+def percentile(values, p):
+
+    return values[min(int(len(values) * p / 100.0), len(values) - 1)]
+
+
+def main():
+
+    parser = argparse.ArgumentParser()
+
+    parser.add_argument('--hosts', type=int, default=256)
+
+    parser.add_argument('--rounds', type=int, default=5)
+
+    parser.add_argument('--pcap')
+
+    parser.add_argument('--serialize', action='store_true')
+
+    parser.add_argument('--no-topo', action='store_true',
+                        help='single switch, no links (plain L2 learning)')
+
+    args = parser.parse_args()
+
+    if args.no_topo:
+
+        switches, links, edges = [1], [], [1]
+
+    else:
+
+        #与Topo.py相同的菱形拓扑，主机接在边缘交换机上
+        switches, links, edges = (range(1, diamond.SWITCHES), diamond.LINKS,
+                                  diamond.EDGES)
+
+    if args.pcap:
+
+        stream = pcap_stream(args.pcap, edges)
+
+    else:
+
+        stream = synthetic_stream(args.hosts, edges)
+
+    app, datapaths = build_app(switches, links, args.serialize)
+
+    events = build_events(stream, datapaths)
+
+    handler = app._packet_in_handler
+
+    clock = time.perf_counter
+
+    latencies = []
+
+    start = clock()
+
+    for _ in range(args.rounds):
+
+        for ev in events:
+
+            t0 = clock()
+
+            handler(ev)
+
+            #应答barrier，等待中的packet-out随之发出
+            for dp in datapaths.values():
+
+                barriers, dp.barriers = dp.barriers, []
+
+                for xid in barriers:
+
+                    app.flows.barrier_reply(dp.id, xid)
+
+            latencies.append(clock() - t0)
+
+    elapsed = clock() - start
+
+    sent = collections.Counter()
+
+    for dp in datapaths.values():
+
+        sent.update(dp.sent)
+
+    total = len(latencies)
+
+    latencies.sort()
+
+    print('%d events (%d x %d rounds) on %d switches' %
+          (total, len(events), args.rounds, len(datapaths)))
+
+    print('throughput   %10.0f events/s' % (total / elapsed))
+
+    print('latency us   p50 %.1f  p90 %.1f  p99 %.1f  max %.1f' %
+          tuple(1e6 * percentile(latencies, p) for p in (50, 90, 99, 100)))
+
+    for name in ('OFPFlowMod', 'OFPGroupMod', 'OFPPacketOut',
+                 'OFPBarrierRequest'):
+
+        print('%-18s %8d  %.3f per packet-in' % (name, sent[name],
+                                                 sent[name] / float(total)))
+
+    print('flow cache       %s' % app.flows.stats)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,378 @@
+#!/usr/bin/python
+#流量矩阵吞吐基准：在本机Mininet上启动实验拓扑，用iperf按流量矩阵并发传输固定大小的流
+#统计聚合吞吐、各流吞吐的Jain公平性指数以及流完成时间（FCT），每次运行追加一行JSON到结果文件
+#同一次运行可以依次比较Ryu.py的三种转发模式：single（单路径）、ecmp（等权组表）、adaptive（按负载调权）
+#用法：sudo python3 bench_traffic.py --topo diamond --matrix permutation --modes single,ecmp,adaptive
+#也可以用 --remote 接外部已经启动的控制器
+
+import argparse
+import functools
+import importlib.util
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+from mininet.net import Mininet
+from mininet.node import OVSSwitch, RemoteController
+from mininet.link import TCLink
+from mininet.log import setLogLevel
+
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+ODL = os.path.join(os.path.dirname(HERE), 'ODL')
+
+
+#按文件路径加载拓扑模块，所在目录加入sys.path以便它导入同目录的模块
+def load(path):
+
+    sys.path.insert(0, os.path.dirname(path))
+
+    name = os.path.splitext(os.path.basename(path))[0]
+
+    spec = importlib.util.spec_from_file_location(name, path)
+
+    module = importlib.util.module_from_spec(spec)
+
+    spec.loader.exec_module(module)
+
+    return module
+
+
+def make_topo(name, size):
+
+    if name == 'diamond':
+
+        return load(os.path.join(HERE, 'Topo.py')).DiamondTopo()
+
+    if name == 'example1':
+
+        return load(os.path.join(ODL, 'example-1', 'topo.py')).MyTopo()
+
+    if name == 'datacenter':
+
+        return load(os.path.join(ODL, 'example-2',
+                                 'datacenter.py')).MyTopo(size or 2)
+
+    if name == 'fattree':
+
+        return load(os.path.join(ODL, 'example-2',
+                                 'fattree.py')).FatTreeTopo(size or 4)
+
+    raise ValueError('unknown topology %s' % name)
+
+
+#流量矩阵：返回 [(源主机名, 目的主机名)]
+def traffic_matrix(kind, hosts, rng, hotspot=None):
+
+    if kind == 'all-to-all':
+
+        return [(a, b) for a in hosts for b in hosts if a != b]
+
+    if kind == 'permutation':
+
+        #没有不动点的随机置换，每个主机恰好发一条流、收一条流
+        while True:
+
+            dsts = list(hosts)
+
+            rng.shuffle(dsts)
+
+            if all(a != b for a, b in zip(hosts, dsts)):
+
+                return list(zip(hosts, dsts))
+
+    if kind == 'hotspot':
+
+        target = hotspot or hosts[-1]
+
+        return [(a, target) for a in hosts if a != target]
+
+    raise ValueError('unknown traffic matrix %s' % kind)
+
+
+def jain(values):
+
+    if not values:
+
+        return 0.0
+
+    return sum(values) ** 2 / (len(values) * sum(v * v for v in values))
+
+
+def percentile(values, p):
+
+    values = sorted(values)
+
+    return values[min(int(len(values) * p / 100.0), len(values) - 1)]
+
+
+#启动控制器：每种模式一个ryu-manager进程，通过环境变量选择Ryu.py的转发模式
+def start_controller(mode, port, log):
+
+    #每次用新的快照文件，不恢复上一种模式留下的流表和组表
+    snapshot = os.path.join(tempfile.mkdtemp(), 'snapshot.db')
+
+    env = dict(os.environ, MULTIPATH_MODE=mode, MULTIPATH_SHARDS='1',
+               MULTIPATH_SNAPSHOT_DB=snapshot)
+
+    return subprocess.Popen(['ryu-manager', '--observe-links',
+                             '--ofp-tcp-listen-port', str(port),
+                             os.path.join(HERE, 'Ryu.py')],
+                            env=env, stdout=log, stderr=subprocess.STDOUT)
+
+
+#等控制器的OpenFlow端口可以连接，控制器提前退出或超时时报错
+def wait_for_port(port, proc=None, timeout=30):
+
+    deadline = time.time() + timeout
+
+    while time.time() < deadline:
+
+        if proc is not None and proc.poll() is not None:
+
+            raise RuntimeError('controller exited with %d' % proc.returncode)
+
+        try:
+
+            socket.create_connection(('127.0.0.1', port), 0.5).close()
+
+            return
+
+        except OSError:
+
+            time.sleep(0.2)
+
+    raise RuntimeError('controller port %d not open after %ds' %
+                       (port, timeout))
+
+
+#并发发起所有流：每条流的服务端各用一个端口，客户端传输size字节，用date记录开始与结束时间
+def run_flows(net, flows, size):
+
+    #记下每个服务端的pid，结束时逐个结束，一个主机上有多个iperf时不会漏掉
+    servers = []
+
+    for i, (src, dst) in enumerate(flows):
+
+        host = net.get(dst)
+
+        out = host.cmd('iperf -s -p %d > /dev/null 2>&1 & echo $!' % (5001 + i))
+
+        servers.append((host, out.split()[-1]))
+
+    try:
+
+        return collect_flows(net, flows, size)
+
+    finally:
+
+        for host, pid in servers:
+
+            host.cmd('kill %s 2> /dev/null' % pid)
+
+
+def collect_flows(net, flows, size):
+
+    time.sleep(1)
+
+    procs = []
+
+    for i, (src, dst) in enumerate(flows):
+
+        script = ('date +%%s.%%N; iperf -c %s -p %d -n %d -y C; date +%%s.%%N'
+                  % (net.get(dst).IP(), 5001 + i, size))
+
+        procs.append(net.get(src).popen(['sh', '-c', script],
+                                        stdout=subprocess.PIPE))
+
+    results = []
+
+    for (src, dst), proc in zip(flows, procs):
+
+        lines = proc.communicate()[0].decode().split()
+
+        #正常输出为：开始时间、iperf的CSV报告、结束时间
+        try:
+
+            if len(lines) != 3 or ',' not in lines[1]:
+
+                raise ValueError(lines)
+
+            start, end = float(lines[0]), float(lines[2])
+
+        except ValueError:
+
+            results.append({'src': src, 'dst': dst, 'failed': True})
+
+            continue
+
+        fct = end - start
+
+        results.append({'src': src, 'dst': dst, 'fct': fct,
+                        'mbps': size * 8 / fct / 1e6,
+                        'start': start, 'end': end})
+
+    return results
+
+
+def summarize(results, size):
+
+    done = [r for r in results if not r.get('failed')]
+
+    if not done:
+
+        return {'flows': len(results), 'failed': len(results)}
+
+    span = max(r['end'] for r in done) - min(r['start'] for r in done)
+
+    fcts = [r['fct'] for r in done]
+
+    return {'flows': len(results), 'failed': len(results) - len(done),
+            'aggregate_mbps': len(done) * size * 8 / span / 1e6,
+            'jain': jain([r['mbps'] for r in done]),
+            'fct_mean': sum(fcts) / len(fcts),
+            'fct_p50': percentile(fcts, 50),
+            'fct_p99': percentile(fcts, 99),
+            'fct_max': max(fcts)}
+
+
+def run_mode(args, mode, flows):
+
+    log = open(os.path.join(args.logdir, 'ryu-%s.log' % mode), 'w')
+
+    controller = None
+
+    if not args.remote:
+
+        controller = start_controller(mode, args.port, log)
+
+        wait_for_port(args.port, controller)
+
+    topo = make_topo(args.topo, args.size)
+
+    switch = functools.partial(OVSSwitch, protocols='OpenFlow13')
+
+    net = Mininet(topo=topo, switch=switch, link=TCLink, controller=None,
+                  autoSetMacs=True)
+
+    net.addController('c0', controller=RemoteController, ip='127.0.0.1',
+                      port=args.port)
+
+    try:
+
+        net.start()
+
+        #等待链路发现，再用一轮ping让控制器学到所有主机
+        time.sleep(args.settle)
+
+        net.pingAll()
+
+        results = run_flows(net, flows, args.bytes)
+
+    finally:
+
+        net.stop()
+
+        if controller is not None:
+
+            controller.terminate()
+
+            controller.wait()
+
+        log.close()
+
+    return results
+
+
+def main():
+
+    parser = argparse.ArgumentParser()
+
+    parser.add_argument('--topo', default='diamond',
+                        choices=['diamond', 'example1', 'datacenter',
+                                 'fattree'])
+
+    parser.add_argument('--size', type=int, default=0,
+                        help='datacenter L1 / fattree k')
+
+    parser.add_argument('--matrix', default='permutation',
+                        choices=['all-to-all', 'permutation', 'hotspot'])
+
+    parser.add_argument('--hotspot', help='destination host for hotspot')
+
+    parser.add_argument('--modes', default='single,ecmp,adaptive')
+
+    parser.add_argument('--bytes', type=int, default=20 * 1000 * 1000,
+                        help='bytes per flow')
+
+    parser.add_argument('--seed', type=int, default=1)
+
+    parser.add_argument('--settle', type=float, default=5,
+                        help='seconds to wait for link discovery')
+
+    parser.add_argument('--port', type=int, default=6633)
+
+    parser.add_argument('--remote', action='store_true',
+                        help='use a controller that is already running')
+
+    parser.add_argument('--output', default='bench_traffic.jsonl')
+
+    parser.add_argument('--logdir', default='.')
+
+    args = parser.parse_args()
+
+    setLogLevel('warning')
+
+    hosts = sorted(make_topo(args.topo, args.size).hosts(),
+                   key=lambda h: int(h[1:]))
+
+    flows = traffic_matrix(args.matrix, hosts, random.Random(args.seed),
+                           args.hotspot)
+
+    print('%s, %s matrix, %d flows of %d bytes' % (args.topo, args.matrix,
+                                                   len(flows), args.bytes))
+
+    rows = []
+
+    for mode in args.modes.split(','):
+
+        results = run_mode(args, mode, flows)
+
+        row = {'time': time.time(), 'topo': args.topo, 'size': args.size,
+               'matrix': args.matrix, 'mode': mode, 'bytes': args.bytes,
+               'seed': args.seed}
+
+        row.update(summarize(results, args.bytes))
+
+        row['per_flow'] = results
+
+        rows.append(row)
+
+        with open(args.output, 'a') as f:
+
+            f.write(json.dumps(row) + '\n')
+
+    print('%-9s %6s %10s %6s %9s %9s' % ('mode', 'failed', 'agg Mbps',
+                                          'jain', 'FCT mean', 'FCT p99'))
+
+    for row in rows:
+
+        if 'aggregate_mbps' not in row:
+
+            print('%-9s %6d  all flows failed' % (row['mode'], row['failed']))
+
+            continue
+
+        print('%-9s %6d %10.1f %6.3f %8.2fs %8.2fs' % (
+            row['mode'], row['failed'], row['aggregate_mbps'], row['jain'],
+            row['fct_mean'], row['fct_p99']))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,21 @@
+#菱形拓扑的唯一定义：Topo.py中的DiamondTopo、multiControllerNet以及bench_replay.py都按这里的链路建拓扑
+#不依赖Mininet，离线基准也可以直接导入
+
+#交换机s0-s10，s0不接任何链路
+SWITCHES = 11
+
+#交换机间链路：(交换机, 端口, 交换机, 端口)
+LINKS = [
+    (1, 2, 2, 1), (1, 3, 3, 1), (2, 2, 4, 1), (2, 3, 5, 1),
+    (3, 2, 6, 1), (3, 3, 7, 1), (4, 2, 8, 1), (5, 2, 8, 2),
+    (6, 2, 9, 1), (7, 2, 9, 2), (8, 3, 10, 1), (9, 3, 10, 2),
+]
+
+#连接主机的边缘交换机
+EDGES = [1, 10]
+
+
+#主机链路：h1接s1的1口，h2起依次接s10的3口、4口……，返回 [(主机编号, 交换机, 端口)]
+def host_links(host_num=4):
+
+    return [(1, 1, 1)] + [(n, 10, n + 1) for n in range(2, host_num + 1)]
@@ -0,0 +1,166 @@
+#packet-in快速解码：只用struct/memoryview从缓冲区读取以太网头、以太类型以及处理函数用到的ARP/IPv4/IPv6/NDP字段
+#需要完整的ryu报文对象时再调用packet()构造
+
+import socket
+import struct
+
+ETH_TYPE_IP = 0x0800
+ETH_TYPE_ARP = 0x0806
+ETH_TYPE_8021Q = 0x8100
+ETH_TYPE_IPV6 = 0x86dd
+
+IPPROTO_ICMPV6 = 58
+
+#ICMPv6邻居请求与邻居通告
+ND_NEIGHBOR_SOLICIT = 135
+ND_NEIGHBOR_ADVERT = 136
+
+_ETH = struct.Struct('!6s6sH')
+_VLAN = struct.Struct('!HH')
+_ARP = struct.Struct('!HHBBH6s4s6s4s')
+_IPV6 = struct.Struct('!4xHBB16s16s')
+_ND = struct.Struct('!B7x16s')
+
+
+#mac地址转成ryu使用的 aa:bb:cc:dd:ee:ff 格式
+def mac_to_text(buf):
+
+    return bytes(buf).hex(':')
+
+
+class ArpHeader(object):
+
+    __slots__ = ('opcode', 'src_mac', 'src_ip', 'dst_mac', 'dst_ip')
+
+    def __init__(self, opcode, src_mac, src_ip, dst_mac, dst_ip):
+
+        self.opcode = opcode
+        self.src_mac = src_mac
+        self.src_ip = src_ip
+        self.dst_mac = dst_mac
+        self.dst_ip = dst_ip
+
+
+class IpHeader(object):
+
+    __slots__ = ('src', 'dst', 'proto', 'offset')
+
+    def __init__(self, src, dst, proto, offset):
+
+        self.src = src
+        self.dst = dst
+        self.proto = proto
+        #上层协议头在帧中的偏移
+        self.offset = offset
+
+
+class NdpHeader(object):
+
+    __slots__ = ('type', 'target')
+
+    def __init__(self, type_, target):
+
+        self.type = type_
+        self.target = target
+
+
+class PacketHeader(object):
+
+    #属性名与ryu的ethernet对象保持一致（src/dst/ethertype），处理函数可以直接替换使用
+    __slots__ = ('data', 'dst', 'src', 'ethertype', 'arp', 'ipv4', 'ipv6',
+                 'ndp', '_pkt')
+
+    def __init__(self, data, dst, src, ethertype):
+
+        self.data = data
+        self.dst = dst
+        self.src = src
+        self.ethertype = ethertype
+        self.arp = None
+        self.ipv4 = None
+        self.ipv6 = None
+        self.ndp = None
+        self._pkt = None
+
+    #按需构造完整的ryu报文对象
+    def packet(self):
+
+        if self._pkt is None:
+
+            from ryu.lib.packet import packet
+
+            self._pkt = packet.Packet(self.data)
+
+        return self._pkt
+
+
+#解码一个以太网帧，帧长度不足以太网头时返回None
+def decode(data):
+
+    buf = memoryview(data)
+
+    if len(buf) < _ETH.size:
+
+        return None
+
+    dst, src, ethertype = _ETH.unpack_from(buf)
+
+    hdr = PacketHeader(data, mac_to_text(dst), mac_to_text(src), ethertype)
+
+    offset = _ETH.size
+
+    inner = ethertype
+
+    #跳过VLAN标签，ethertype仍保持外层的值（与ryu的ethernet对象一致）
+    while inner == ETH_TYPE_8021Q and len(buf) >= offset + _VLAN.size:
+
+        inner = _VLAN.unpack_from(buf, offset)[1]
+
+        offset += _VLAN.size
+
+    if inner == ETH_TYPE_ARP:
+
+        if len(buf) >= offset + _ARP.size:
+
+            (_, _, _, _, opcode, src_mac, src_ip,
+             dst_mac, dst_ip) = _ARP.unpack_from(buf, offset)
+
+            hdr.arp = ArpHeader(opcode, mac_to_text(src_mac),
+                                socket.inet_ntoa(src_ip),
+                                mac_to_text(dst_mac),
+                                socket.inet_ntoa(dst_ip))
+
+    elif inner == ETH_TYPE_IP:
+
+        if len(buf) >= offset + 20:
+
+            ihl = (buf[offset] & 0x0f) * 4
+
+            hdr.ipv4 = IpHeader(socket.inet_ntoa(buf[offset + 12:offset + 16]),
+                                socket.inet_ntoa(buf[offset + 16:offset + 20]),
+                                buf[offset + 9], offset + ihl)
+
+    elif inner == ETH_TYPE_IPV6:
+
+        if len(buf) >= offset + _IPV6.size:
+
+            _, nxt, _, src, dst = _IPV6.unpack_from(buf, offset)
+
+            hdr.ipv6 = IpHeader(socket.inet_ntop(socket.AF_INET6, src),
+                                socket.inet_ntop(socket.AF_INET6, dst),
+                                nxt, offset + _IPV6.size)
+
+            offset = hdr.ipv6.offset
+
+            #邻居请求/通告紧跟在IPv6头之后（NDP不带扩展头）
+            if nxt == IPPROTO_ICMPV6 and len(buf) >= offset + _ND.size:
+
+                icmp_type, target = _ND.unpack_from(buf, offset)
+
+                if icmp_type in (ND_NEIGHBOR_SOLICIT, ND_NEIGHBOR_ADVERT):
+
+                    hdr.ndp = NdpHeader(icmp_type,
+                                        socket.inet_ntop(socket.AF_INET6,
+                                                         target))
+
+    return hdr
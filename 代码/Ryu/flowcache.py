@@ -0,0 +1,294 @@
+#流表下发缓存：按 (优先级, 匹配域, 动作) 记录每个交换机已下发的流表，丢弃重复的下发
+#流表修改消息按交换机攒批，flush时多于一条的批次跟一个OFPBarrierRequest，在BarrierReply中异步确认；
+#只有一条消息的批次不单独跟barrier，留到下一个barrier一起确认
+#packet-out排在流表修改之后：本次flush下发了流表的交换机都跟一个barrier，全部确认后才发出packet-out，
+#转发出去的包到达下游交换机时规则已经装好，不会再触发packet-in
+
+
+def match_key(match):
+
+    return tuple(sorted(match.items()))
+
+
+#动作按类型取出决定转发行为的几个属性组成元组，比较时不必经过ryu的字符串化
+def action_key(action):
+
+    return (action.type, getattr(action, 'port', None),
+            getattr(action, 'max_len', None), getattr(action, 'group_id', None),
+            getattr(action, 'key', None), getattr(action, 'value', None),
+            getattr(action, 'ethertype', None))
+
+
+def actions_key(actions):
+
+    return tuple(action_key(action) for action in actions)
+
+
+class FlowInstaller(object):
+
+    def __init__(self, logger=None, max_unconfirmed=32):
+
+        self.logger = logger
+
+        #没有跟barrier的消息攒到这么多条时也发一个barrier，限制xids表的大小
+        self.max_unconfirmed = max_unconfirmed
+
+        #dpid -> {(优先级, 匹配域): 动作}
+        self.installed = {}
+
+        #dpid -> {(优先级, 匹配域): 流表消息}，用于保存快照以及重启后补下发
+        self.mods = {}
+
+        #dpid -> (datapath, [(消息, 缓存键)])，等待flush的消息
+        self.queue = {}
+
+        #dpid -> {barrier的xid: [本批流表消息的xid]}，以及 dpid -> {流表消息的xid: 缓存键}
+        self.pending = {}
+
+        self.xids = {}
+
+        #dpid -> [已发送、还没有跟barrier的流表消息的xid]
+        self.unconfirmed = {}
+
+        #等待下一次flush的packet-out [(datapath, 消息)]，以及等待barrier确认的 [([(datapath, 消息)], {(dpid, barrier的xid)})]
+        self.outs = []
+
+        self.held = []
+
+        #计数：请求下发数，实际发送的下发消息数，去重节省数，删除消息数，barrier数，已确认barrier数，失败数
+        #requested = sent + saved（交换机断开时丢弃的队列除外）
+        self.stats = {'requested': 0, 'sent': 0, 'saved': 0, 'deleted': 0,
+                      'batches': 0, 'confirmed': 0, 'failed': 0}
+
+    #登记一条流表，已下发过完全相同的流表时返回False
+    #mod可以是构造流表消息的函数，只有需要下发时才调用，命中缓存时不构造消息
+    def install(self, datapath, mod, priority, match, actions):
+
+        self.stats['requested'] += 1
+
+        table = self.installed.setdefault(datapath.id, {})
+
+        key = (priority, match_key(match))
+
+        value = actions_key(actions)
+
+        if table.get(key) == value:
+
+            self.stats['saved'] += 1
+
+            return False
+
+        if callable(mod):
+
+            mod = mod()
+
+        table[key] = value
+
+        self.mods.setdefault(datapath.id, {})[key] = mod
+
+        self._enqueue(datapath, mod, key)
+
+        return True
+
+    #登记交换机上已经存在的流表（重启后对账得到），不再下发
+    def adopt(self, datapath, mod, priority, match, actions):
+
+        key = (priority, match_key(match))
+
+        self.installed.setdefault(datapath.id, {})[key] = actions_key(actions)
+
+        self.mods.setdefault(datapath.id, {})[key] = mod
+
+    #登记一条删除消息，同时清除被它覆盖的缓存项
+    #给出priority时为严格匹配，否则为非严格匹配：缓存项的匹配域包含删除的匹配域
+    def delete(self, datapath, mod, match, priority=None):
+
+        if priority is not None:
+
+            self.removed(datapath.id, priority, match)
+
+        else:
+
+            fields = set(match.items())
+
+            table = self.installed.get(datapath.id, {})
+
+            mods = self.mods.get(datapath.id, {})
+
+            for key in [k for k in table if fields.issubset(k[1])]:
+
+                del table[key]
+
+                mods.pop(key, None)
+
+        self._enqueue(datapath, mod, None)
+
+    #交换机上的流表已被删除（超时、淘汰或FlowRemoved上报）
+    def removed(self, dpid, priority, match):
+
+        key = (priority, match_key(match))
+
+        self.installed.get(dpid, {}).pop(key, None)
+
+        self.mods.get(dpid, {}).pop(key, None)
+
+    #交换机流表当前的占用数
+    def occupancy(self, dpid):
+
+        return len(self.installed.get(dpid, ()))
+
+    def _enqueue(self, datapath, mod, key):
+
+        self.queue.setdefault(datapath.id, (datapath, []))[1].append((mod, key))
+
+    #packet-out等本次攒下的流表修改都被交换机处理之后再发出
+    def send_after(self, datapath, msg):
+
+        self.outs.append((datapath, msg))
+
+    #把攒下的消息发给各交换机，多于一条消息的批次、未确认的消息攒够或者后面有packet-out时跟一个barrier
+    def flush(self):
+
+        queue, self.queue = self.queue, {}
+
+        outs, self.outs = self.outs, []
+
+        waiting = set()
+
+        for dpid, (datapath, mods) in queue.items():
+
+            xids = self.xids.setdefault(dpid, {})
+
+            batch = self.unconfirmed.setdefault(dpid, [])
+
+            for mod, key in mods:
+
+                datapath.set_xid(mod)
+
+                datapath.send_msg(mod)
+
+                if key is not None:
+
+                    xids[mod.xid] = key
+
+                    batch.append(mod.xid)
+
+                    self.stats['sent'] += 1
+
+                else:
+
+                    self.stats['deleted'] += 1
+
+            if len(mods) < 2 and len(batch) < self.max_unconfirmed and \
+                    not outs:
+
+                continue
+
+            barrier = datapath.ofproto_parser.OFPBarrierRequest(datapath)
+
+            datapath.set_xid(barrier)
+
+            datapath.send_msg(barrier)
+
+            waiting.add((dpid, barrier.xid))
+
+            self.pending.setdefault(dpid, {})[barrier.xid] = batch
+
+            self.unconfirmed[dpid] = []
+
+            self.stats['batches'] += 1
+
+            if self.logger is not None:
+
+                self.logger.debug("flush %d flow-mods to s%s, %d saved so far",
+
+                                  len(mods), dpid, self.stats['saved'])
+
+        if waiting:
+
+            self.held.append((outs, waiting))
+
+        else:
+
+            self._send(outs)
+
+    def _send(self, outs):
+
+        for datapath, msg in outs:
+
+            datapath.send_msg(msg)
+
+    #所等的barrier都已确认（或交换机已断开）的packet-out按原来的顺序发出
+    def _release(self, dpid, xid=None):
+
+        held = []
+
+        for outs, waiting in self.held:
+
+            for entry in [w for w in waiting
+                          if w[0] == dpid and xid in (None, w[1])]:
+
+                waiting.discard(entry)
+
+            if waiting:
+
+                held.append((outs, waiting))
+
+            else:
+
+                self._send(outs)
+
+        self.held = held
+
+    #BarrierReply到达说明本批流表消息都已被交换机处理
+    def barrier_reply(self, dpid, xid):
+
+        if self.held:
+
+            self._release(dpid, xid)
+
+        batch = self.pending.get(dpid, {}).pop(xid, None)
+
+        if batch is None:
+
+            return
+
+        xids = self.xids.get(dpid, {})
+
+        for mod_xid in batch:
+
+            xids.pop(mod_xid, None)
+
+        self.stats['confirmed'] += 1
+
+    #下发失败的流表从缓存中删除，下次会重新下发
+    def error(self, dpid, xid):
+
+        key = self.xids.get(dpid, {}).pop(xid, None)
+
+        if key is None:
+
+            return
+
+        self.installed.get(dpid, {}).pop(key, None)
+
+        self.mods.get(dpid, {}).pop(key, None)
+
+        self.stats['failed'] += 1
+
+    #交换机断开或重连时清空它的状态
+    def forget(self, dpid):
+
+        for table in (self.installed, self.mods, self.queue, self.pending,
+                      self.xids, self.unconfirmed):
+
+            table.pop(dpid, None)
+
+        #不再等待该交换机的barrier，发往该交换机的packet-out丢弃
+        self.outs = [(dp, msg) for dp, msg in self.outs if dp.id != dpid]
+
+        for outs, waiting in self.held:
+
+            outs[:] = [(dp, msg) for dp, msg in outs if dp.id != dpid]
+
+        self._release(dpid)
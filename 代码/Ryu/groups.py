@@ -0,0 +1,121 @@
+#组表登记：按交换机分配组表编号，出端口集合相同的路由流表共用一个组表，并记录引用每个组表的流表
+#流表被删除或超时后引用随之失效，没有引用的组表由sweep找出后删除，组表表项不会越用越多
+
+
+class GroupRegistry(object):
+
+    def __init__(self, base=50):
+
+        #编号从base开始分配，base以下留给广播组表等固定编号的组表
+        self.base = base
+
+        #dpid -> {出端口元组: group_id}，以及反向的 dpid -> {group_id: 出端口元组}
+        self.ids = {}
+
+        self.ports = {}
+
+        #dpid -> {group_id: 权重元组}
+        self.weights = {}
+
+        #dpid -> {流表缓存键: group_id}，缓存键与FlowInstaller中的 (优先级, 匹配域) 相同
+        self.users = {}
+
+    #出端口集合已有组表时返回其编号，否则返回None
+    def lookup(self, dpid, ports):
+
+        return self.ids.get(dpid, {}).get(ports)
+
+    #为一组出端口分配第一个没有用过的编号并登记
+    def allocate(self, dpid, ports):
+
+        used = self.ports.setdefault(dpid, {})
+
+        group_id = self.base
+
+        while group_id in used:
+
+            group_id += 1
+
+        self.register(dpid, group_id, ports)
+
+        return group_id
+
+    #登记一个组表（新分配的，或者对账时在交换机上发现的）
+    def register(self, dpid, group_id, ports, weights=None):
+
+        old = self.ports.setdefault(dpid, {}).get(group_id)
+
+        if old is not None:
+
+            self.ids[dpid].pop(old, None)
+
+        self.ids.setdefault(dpid, {})[ports] = group_id
+
+        self.ports[dpid][group_id] = ports
+
+        if weights is not None:
+
+            self.weights.setdefault(dpid, {})[group_id] = weights
+
+    def set_weights(self, dpid, group_id, weights):
+
+        self.weights.setdefault(dpid, {})[group_id] = weights
+
+    #流表key改为引用group_id，原来引用的组表随之少一个引用
+    def ref(self, dpid, key, group_id):
+
+        self.users.setdefault(dpid, {})[key] = group_id
+
+    #流表key不再引用组表（改成了单端口转发）
+    def release(self, dpid, key):
+
+        self.users.get(dpid, {}).pop(key, None)
+
+    #各组表当前的引用数
+    def refcounts(self, dpid):
+
+        counts = dict((group_id, 0) for group_id in self.ports.get(dpid, {}))
+
+        for group_id in self.users.get(dpid, {}).values():
+
+            if group_id in counts:
+
+                counts[group_id] += 1
+
+        return counts
+
+    #live为交换机上仍然存在的流表缓存键：先丢弃已经不存在的流表的引用，再返回没有引用的组表编号
+    def sweep(self, dpid, live):
+
+        users = self.users.get(dpid, {})
+
+        for key in [k for k in users if k not in live]:
+
+            del users[key]
+
+        return [group_id for group_id, count in self.refcounts(dpid).items()
+                if count == 0]
+
+    #删除组表的登记，以及引用它的流表（交换机删除组表时会一并删除这些流表）
+    def remove(self, dpid, group_id):
+
+        ports = self.ports.get(dpid, {}).pop(group_id, None)
+
+        if ports is not None:
+
+            self.ids[dpid].pop(ports, None)
+
+        self.weights.get(dpid, {}).pop(group_id, None)
+
+        users = self.users.get(dpid, {})
+
+        for key in [k for k, g in users.items() if g == group_id]:
+
+            del users[key]
+
+    #交换机断开或交给其它实例时清空它的登记
+    def forget(self, dpid):
+
+        for table in (self.ids, self.ports, self.weights, self.users):
+
+            table.pop(dpid, None)
@@ -0,0 +1,163 @@
+#全局主机位置表：按IP和MAC索引主机，记录主机接入的交换机与端口
+#由ARP和IPv4的packet-in填充，供ARP代理和多路径路由查询
+#与mac学习表一样有界并且会老化：OrderedDict按最近学习时间排序，表满时淘汰最久未刷新的主机（或IP），
+#老化也从表头开始；伪造源mac/IP的报文不会让控制器内存无限增长
+
+import time
+from collections import OrderedDict
+
+
+class Host(object):
+
+    __slots__ = ('mac', 'dpid', 'port', 'ips', 'seen')
+
+    def __init__(self, mac, dpid, port):
+
+        self.mac = mac
+        self.dpid = dpid
+        self.port = port
+        self.ips = set()
+        self.seen = 0
+
+
+class HostTracker(object):
+
+    def __init__(self, max_entries=100000, max_age=300):
+
+        self.max_entries = max_entries
+
+        self.max_age = max_age
+
+        #ip -> Host，mac -> Host
+        self.by_ip = OrderedDict()
+
+        self.by_mac = OrderedDict()
+
+        #因表满被淘汰、还没有由expire交给调用方清理的主机
+        self.dropped = []
+
+        #因表满被淘汰和因老化被删除的表项数
+        self.evicted = 0
+
+        self.expired = 0
+
+    #学习主机位置，返回主机是否为新主机或者位置发生了变化
+    def learn(self, mac, dpid, port, ip=None, now=None):
+
+        if now is None:
+
+            now = time.monotonic()
+
+        host = self.by_mac.pop(mac, None)
+
+        moved = host is None or (host.dpid, host.port) != (dpid, port)
+
+        if host is None:
+
+            host = Host(mac, dpid, port)
+
+        else:
+
+            host.dpid = dpid
+
+            host.port = port
+
+        host.seen = now
+
+        self.by_mac[mac] = host
+
+        #0.0.0.0是ARP探测报文的源地址，不记录
+        if ip and ip != '0.0.0.0':
+
+            old = self.by_ip.pop(ip, None)
+
+            if old is not None and old is not host:
+
+                old.ips.discard(ip)
+
+            self.by_ip[ip] = host
+
+            host.ips.add(ip)
+
+        while len(self.by_mac) > self.max_entries:
+
+            self.dropped.append(self._remove(self.by_mac.popitem(last=False)[1]))
+
+            self.evicted += 1
+
+        while len(self.by_ip) > self.max_entries:
+
+            ip, old = self.by_ip.popitem(last=False)
+
+            old.ips.discard(ip)
+
+            self.evicted += 1
+
+        return moved
+
+    def get(self, ip):
+
+        return self.by_ip.get(ip)
+
+    #按mac查询主机位置 (dpid, port)
+    def locate(self, mac):
+
+        host = self.by_mac.get(mac)
+
+        if host is None:
+
+            return None
+
+        return host.dpid, host.port
+
+    #删除接在某个端口上的主机（该端口后来被发现是交换机互联端口）
+    def remove_port(self, dpid, port):
+
+        for mac, host in list(self.by_mac.items()):
+
+            if host.dpid == dpid and host.port == port:
+
+                self.remove(mac)
+
+    def remove(self, mac):
+
+        host = self.by_mac.pop(mac, None)
+
+        if host is not None:
+
+            self._remove(host)
+
+    def _remove(self, host):
+
+        for ip in host.ips:
+
+            if self.by_ip.get(ip) is host:
+
+                del self.by_ip[ip]
+
+        return host
+
+    #删除所有老化的主机，返回这些主机以及上次调用以来因表满被淘汰的主机
+    def expire(self, now=None):
+
+        if now is None:
+
+            now = time.monotonic()
+
+        removed, self.dropped = self.dropped, []
+
+        while self.by_mac:
+
+            host = next(iter(self.by_mac.values()))
+
+            if now - host.seen <= self.max_age:
+
+                break
+
+            del self.by_mac[host.mac]
+
+            removed.append(self._remove(host))
+
+            self.expired += 1
+
+        return removed
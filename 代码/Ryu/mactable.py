@@ -0,0 +1,143 @@
+#有界、会老化的mac学习表：键为 dpid<<48|整数mac，值为 (端口, 最近学习时间)
+#OrderedDict按最近学习时间排序，表满时淘汰最久未刷新的表项，老化也从表头开始
+
+import time
+from collections import OrderedDict
+
+
+def mac_to_int(mac):
+
+    return int(mac.replace(':', ''), 16)
+
+
+def int_to_mac(value):
+
+    return ':'.join('%02x' % ((value >> s) & 0xff) for s in range(40, -8, -8))
+
+
+class MacTable(object):
+
+    def __init__(self, max_entries=100000, max_age=300):
+
+        self.max_entries = max_entries
+
+        self.max_age = max_age
+
+        self.entries = OrderedDict()
+
+        #因表满被淘汰和因老化被删除的表项数
+        self.evicted = 0
+
+        self.expired = 0
+
+    def __len__(self):
+
+        return len(self.entries)
+
+    @staticmethod
+    def _key(dpid, mac):
+
+        return (dpid << 48) | mac_to_int(mac)
+
+    #学习或刷新一个表项，返回原来的端口（没有时为None）
+    def learn(self, dpid, mac, port, now=None):
+
+        if now is None:
+
+            now = time.monotonic()
+
+        key = self._key(dpid, mac)
+
+        old = self.entries.pop(key, None)
+
+        self.entries[key] = (port, now)
+
+        if old is None and len(self.entries) > self.max_entries:
+
+            self.entries.popitem(last=False)
+
+            self.evicted += 1
+
+        return None if old is None else old[0]
+
+    #查询端口，表项已老化时删除并返回None
+    def get(self, dpid, mac, now=None):
+
+        key = self._key(dpid, mac)
+
+        entry = self.entries.get(key)
+
+        if entry is None:
+
+            return None
+
+        if now is None:
+
+            now = time.monotonic()
+
+        if now - entry[1] > self.max_age:
+
+            del self.entries[key]
+
+            self.expired += 1
+
+            return None
+
+        return entry[0]
+
+    #表项距上次学习经过的秒数，没有该表项时返回None
+    def age(self, dpid, mac, now=None):
+
+        entry = self.entries.get(self._key(dpid, mac))
+
+        if entry is None:
+
+            return None
+
+        if now is None:
+
+            now = time.monotonic()
+
+        return now - entry[1]
+
+    def remove(self, dpid, mac):
+
+        return self.entries.pop(self._key(dpid, mac), None) is not None
+
+    def remove_dpid(self, dpid):
+
+        for key in [k for k in self.entries if k >> 48 == dpid]:
+
+            del self.entries[key]
+
+    #删除所有老化的表项，返回 [(dpid, mac)]
+    def expire(self, now=None):
+
+        if now is None:
+
+            now = time.monotonic()
+
+        removed = []
+
+        while self.entries:
+
+            key, (port, learned) = next(iter(self.entries.items()))
+
+            if now - learned <= self.max_age:
+
+                break
+
+            del self.entries[key]
+
+            removed.append((key >> 48, int_to_mac(key & 0xffffffffffff)))
+
+        self.expired += len(removed)
+
+        return removed
+
+    #遍历全部表项 (dpid, mac, 端口)，用于保存快照
+    def items(self):
+
+        for key, (port, learned) in self.entries.items():
+
+            yield key >> 48, int_to_mac(key & 0xffffffffffff), port
@@ -0,0 +1,114 @@
+#控制器热路径上的计数器与耗时直方图，按Prometheus文本格式导出
+#指标先用describe声明类型与标签名，记录时只按标签值元组累加，开销只有一次字典查找
+
+import bisect
+
+
+#耗时直方图的桶上界（秒）
+LATENCY_BUCKETS = (0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005,
+                   0.01, 0.025, 0.05, 0.1, 0.25)
+
+
+def _labels(names, values, extra=''):
+
+    pairs = ['%s="%s"' % (name, value) for name, value in zip(names, values)]
+
+    if extra:
+
+        pairs.append(extra)
+
+    return '{%s}' % ','.join(pairs) if pairs else ''
+
+
+class Metrics(object):
+
+    def __init__(self, prefix='multipath', buckets=LATENCY_BUCKETS):
+
+        self.prefix = prefix
+
+        self.buckets = buckets
+
+        #name -> (类型, 说明, 标签名元组)
+        self.meta = {}
+
+        #name -> {标签值元组: 值}；直方图的值为 [各桶计数..., +Inf桶计数, 总和]
+        self.values = {}
+
+        #导出前调用的回调，用来刷新表项数之类的当前值
+        self.collectors = []
+
+    def describe(self, name, kind, text, labels=()):
+
+        self.meta[name] = (kind, text, tuple(labels))
+
+        self.values.setdefault(name, {})
+
+    def inc(self, name, *labels):
+
+        table = self.values[name]
+
+        table[labels] = table.get(labels, 0) + 1
+
+    #直接设置当前值（gauge，或从别处读来的累计计数）
+    def set(self, name, value, *labels):
+
+        self.values[name][labels] = value
+
+    def observe(self, name, seconds, *labels):
+
+        table = self.values[name]
+
+        row = table.get(labels)
+
+        if row is None:
+
+            row = table[labels] = [0] * (len(self.buckets) + 1) + [0.0]
+
+        row[bisect.bisect_left(self.buckets, seconds)] += 1
+
+        row[-1] += seconds
+
+    def render(self):
+
+        for collect in self.collectors:
+
+            collect()
+
+        lines = []
+
+        for name in sorted(self.meta):
+
+            kind, text, names = self.meta[name]
+
+            full = '%s_%s' % (self.prefix, name)
+
+            lines.append('# HELP %s %s' % (full, text))
+
+            lines.append('# TYPE %s %s' % (full, kind))
+
+            for labels, value in sorted(self.values[name].items()):
+
+                if kind != 'histogram':
+
+                    lines.append('%s%s %s' % (full, _labels(names, labels),
+                                              value))
+
+                    continue
+
+                count = 0
+
+                for bound, n in zip(self.buckets + ('+Inf',), value[:-1]):
+
+                    count += n
+
+                    lines.append('%s_bucket%s %d' % (
+                        full, _labels(names, labels, 'le="%s"' % bound),
+                        count))
+
+                lines.append('%s_sum%s %.6f' % (full, _labels(names, labels),
+                                                value[-1]))
+
+                lines.append('%s_count%s %d' % (full, _labels(names, labels),
+                                                count))
+
+        return '\n'.join(lines) + '\n'
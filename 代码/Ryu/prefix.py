@@ -0,0 +1,196 @@
+#按目的地址前缀聚合转发规则：一个交换机上去往各主机的出端口（端口或组表）相同、且地址连成完整对齐块的主机合并成一条前缀规则，
+#块内出现出端口不同的主机或主机离开时再拆开；前缀只覆盖已知主机，去往未学习地址的包仍然上送控制器
+#得到的前缀互不重叠，可以用同一优先级下发；主机或出端口变化时只重算包含变化地址的块
+
+import bisect
+import socket
+import struct
+
+
+def ip_to_int(ip):
+
+    return struct.unpack('!I', socket.inet_aton(ip))[0]
+
+
+def int_to_ip(value):
+
+    return socket.inet_ntoa(struct.pack('!I', value))
+
+
+def _mask(length):
+
+    return (0xffffffff << (32 - length)) & 0xffffffff
+
+
+def prefix_mask(length):
+
+    return int_to_ip(_mask(length))
+
+
+class PrefixTable(object):
+
+    def __init__(self):
+
+        #地址整数 -> 出端口元组，以及有序的地址列表（按块查询地址范围）
+        self.entries = {}
+
+        self.keys = []
+
+        #(网络地址, 前缀长度) -> 出端口元组，交换机上应有的前缀规则
+        self.rules = {}
+
+    #块内的已知地址在keys中的下标范围
+    def _span(self, net, length):
+
+        lo = bisect.bisect_left(self.keys, net)
+
+        hi = bisect.bisect_left(self.keys, net + (1 << (32 - length)), lo)
+
+        return lo, hi
+
+    #块内地址全部是已知主机且出端口相同时返回该出端口，否则返回None
+    def _uniform(self, net, length):
+
+        lo, hi = self._span(net, length)
+
+        if hi - lo != 1 << (32 - length):
+
+            return None
+
+        ports = self.entries[self.keys[lo]]
+
+        for i in range(lo + 1, hi):
+
+            if self.entries[self.keys[i]] != ports:
+
+                return None
+
+        return ports
+
+    #当前包含ip的前缀规则
+    def _covering(self, ip):
+
+        for length in range(32, -1, -1):
+
+            key = (ip & _mask(length), length)
+
+            if key in self.rules:
+
+                return key
+
+        return None
+
+    #包含ip的最大的可合并块
+    def _block(self, ip):
+
+        length = 32
+
+        while length > 0 and \
+                self._uniform(ip & _mask(length - 1), length - 1) is not None:
+
+            length -= 1
+
+        return ip & _mask(length), length
+
+    #块内已知地址的最少前缀划分
+    def _aggregate(self, net, length, rules):
+
+        ports = self._uniform(net, length)
+
+        if ports is not None:
+
+            rules[(net, length)] = ports
+
+            return
+
+        lo, hi = self._span(net, length)
+
+        if hi == lo:
+
+            return
+
+        half = net + (1 << (31 - length))
+
+        self._aggregate(net, length + 1, rules)
+
+        self._aggregate(half, length + 1, rules)
+
+    #changes: {地址整数: 出端口元组，None表示主机离开或不可达}
+    #返回规则的变化 (新增或出端口改变的 {(网络地址, 前缀长度): 出端口}, 删除的 [(网络地址, 前缀长度)])
+    def update(self, changes):
+
+        regions = []
+
+        for ip, ports in changes.items():
+
+            old = self.entries.get(ip)
+
+            if old == ports:
+
+                continue
+
+            rule = self._covering(ip)
+
+            if rule is not None:
+
+                regions.append(rule)
+
+            if ports is None:
+
+                del self.entries[ip]
+
+                del self.keys[bisect.bisect_left(self.keys, ip)]
+
+                continue
+
+            if old is None:
+
+                bisect.insort(self.keys, ip)
+
+            self.entries[ip] = ports
+
+            regions.append(self._block(ip))
+
+        #只保留最外层的块，块之间要么嵌套要么不相交
+        regions.sort(key=lambda r: r[1])
+
+        outer = []
+
+        for net, length in regions:
+
+            if not any(net & _mask(l) == n for n, l in outer if l <= length):
+
+                outer.append((net, length))
+
+        added = {}
+
+        removed = []
+
+        for net, length in outer:
+
+            mask = _mask(length)
+
+            old = [k for k in self.rules
+                   if k[1] >= length and k[0] & mask == net]
+
+            new = {}
+
+            self._aggregate(net, length, new)
+
+            for key in old:
+
+                if key not in new:
+
+                    removed.append(key)
+
+                    del self.rules[key]
+
+            for key, ports in new.items():
+
+                if self.rules.get(key) != ports:
+
+                    added[key] = ports
+
+                    self.rules[key] = ports
+
+        return added, removed
@@ -0,0 +1,394 @@
+#路由引擎：根据链路发现事件维护交换机拓扑，为每一对边缘交换机预先计算k条等价最短路径
+#链路或交换机变化时只重算受影响的交换机对，packet-in时查表为O(1)
+
+from collections import deque
+
+
+class RouteEngine(object):
+
+    def __init__(self, k=4):
+
+        #每对交换机最多保留的等价路径数
+        self.k = k
+
+        #邻接表：dpid -> {邻居dpid: 本端出端口}
+        self.adj = {}
+
+        #连接主机的边缘交换机
+        self.edges = set()
+
+        #以每个边缘交换机为源的BFS跳数表：dpid -> {dpid: 跳数}
+        self.dist = {}
+
+        #预计算结果：(源, 目的) -> 路径元组 / 每一跳的出端口集合
+        self.routes = {}
+        self.hops = {}
+
+        #链路到使用该链路的交换机对的索引，用于增量更新
+        self.link_index = {}
+        self.pair_links = {}
+
+    #链路用无序二元组作为键
+    @staticmethod
+    def _link_key(u, v):
+
+        return (u, v) if u < v else (v, u)
+
+    def add_switch(self, dpid):
+
+        self.adj.setdefault(dpid, {})
+
+    def remove_switch(self, dpid):
+
+        changed = {}
+
+        for nbr in list(self.adj.get(dpid, {})):
+
+            self._merge(changed, self.remove_link(dpid, nbr))
+
+        if dpid in self.edges:
+
+            self.edges.discard(dpid)
+
+            self.dist.pop(dpid, None)
+
+            for other in list(self.edges):
+
+                for pair in ((dpid, other), (other, dpid)):
+
+                    if pair in self.hops:
+
+                        changed.setdefault(pair, self.hops[pair])
+
+                self._drop_pair(dpid, other)
+
+        self.adj.pop(dpid, None)
+
+        return changed
+
+    #判断端口是否为交换机间链路端口（非主机端口）
+    def is_link_port(self, dpid, port_no):
+
+        return port_no in self.adj.get(dpid, {}).values()
+
+    #登记边缘交换机并计算它与其它边缘交换机之间的路径
+    def add_edge(self, dpid):
+
+        if dpid in self.edges:
+
+            return {}
+
+        self.add_switch(dpid)
+
+        self.dist[dpid] = self._bfs(dpid)
+
+        self.edges.add(dpid)
+
+        changed = {}
+
+        for other in self.edges:
+
+            if other != dpid:
+
+                changed.update(self._compute_pair(dpid, other))
+
+        return changed
+
+    #新增链路：只重算新链路能提供不长于原最短路的交换机对
+    def add_link(self, src, src_port, dst, dst_port):
+
+        if src == dst:
+
+            return {}
+
+        changed = {}
+
+        old = self.adj.get(src, {}).get(dst), self.adj.get(dst, {}).get(src)
+
+        if old == (src_port, dst_port):
+
+            return changed
+
+        if None not in old:
+
+            #端口发生变化，先按删除处理
+            self._merge(changed, self.remove_link(src, dst))
+
+        inf = float('inf')
+
+        affected = []
+
+        edges = sorted(self.edges)
+
+        for i, s in enumerate(edges):
+
+            ds = self.dist[s]
+
+            for d in edges[i + 1:]:
+
+                dd = self.dist[d]
+
+                via = min(ds.get(src, inf) + 1 + dd.get(dst, inf),
+                          ds.get(dst, inf) + 1 + dd.get(src, inf))
+
+                if via != inf and via <= ds.get(d, inf):
+
+                    affected.append((s, d))
+
+        #源到链路两端的跳数差大于1时，新链路会缩短该源的BFS表
+        stale = [s for s in edges
+                 if abs(self.dist[s].get(src, inf) -
+                        self.dist[s].get(dst, inf)) > 1]
+
+        self.adj.setdefault(src, {})[dst] = src_port
+
+        self.adj.setdefault(dst, {})[src] = dst_port
+
+        for s in stale:
+
+            self.dist[s] = self._bfs(s)
+
+        for s, d in affected:
+
+            self._merge(changed, self._compute_pair(s, d))
+
+        return changed
+
+    #删除链路：只重算曾经使用过该链路的交换机对
+    def remove_link(self, src, dst):
+
+        if dst not in self.adj.get(src, {}):
+
+            return {}
+
+        inf = float('inf')
+
+        #链路位于某个源的最短路DAG上时该源的BFS表需要刷新
+        stale = [s for s in self.edges
+                 if abs(self.dist[s].get(src, inf) -
+                        self.dist[s].get(dst, inf)) == 1]
+
+        del self.adj[src][dst]
+
+        self.adj.get(dst, {}).pop(src, None)
+
+        for s in stale:
+
+            self.dist[s] = self._bfs(s)
+
+        changed = {}
+
+        for s, d in self.link_index.pop(self._link_key(src, dst), set()):
+
+            changed.update(self._compute_pair(s, d))
+
+        return changed
+
+    #广播用的生成树：每个连通分量以最小的dpid为根做BFS，所有实例算出的树一致
+    #返回 {dpid: 树上链路的本端端口集合}
+    def spanning_tree(self):
+
+        ports = dict((dpid, set()) for dpid in self.adj)
+
+        seen = set()
+
+        for root in sorted(self.adj):
+
+            if root in seen:
+
+                continue
+
+            seen.add(root)
+
+            queue = deque([root])
+
+            while queue:
+
+                u = queue.popleft()
+
+                for v in sorted(self.adj[u]):
+
+                    if v in seen:
+
+                        continue
+
+                    seen.add(v)
+
+                    ports[u].add(self.adj[u][v])
+
+                    ports.setdefault(v, set()).add(self.adj[v][u])
+
+                    queue.append(v)
+
+        return ports
+
+    #O(1)查询：返回 {dpid: (出端口, ...)}，不可达时返回None
+    def get_hops(self, src, dst):
+
+        return self.hops.get((src, dst))
+
+    def get_paths(self, src, dst):
+
+        return self.routes.get((src, dst), ())
+
+    #以边缘交换机dst为终点的最短路DAG，与源无关，用于按目的地址聚合的规则
+    #返回 {dpid: 朝向dst的出端口元组}，每个交换机最多k个出端口
+    def next_hops(self, dst):
+
+        dd = self.dist.get(dst)
+
+        if dd is None:
+
+            return {}
+
+        hops = {}
+
+        for node, d in dd.items():
+
+            ports = sorted(port for nbr, port in self.adj.get(node, {}).items()
+                           if dd.get(nbr) == d - 1)
+
+            if ports:
+
+                hops[node] = tuple(ports[:self.k])
+
+        return hops
+
+    def _bfs(self, src):
+
+        dist = {src: 0}
+
+        queue = deque([src])
+
+        while queue:
+
+            node = queue.popleft()
+
+            for nbr in self.adj.get(node, {}):
+
+                if nbr not in dist:
+
+                    dist[nbr] = dist[node] + 1
+
+                    queue.append(nbr)
+
+        return dist
+
+    #沿最短路DAG深度优先枚举至多k条等价路径
+    def _k_paths(self, src, dst):
+
+        ds = self.dist[src]
+
+        dd = self.dist[dst]
+
+        if dst not in ds:
+
+            return []
+
+        paths = []
+
+        stack = [(src, (src,))]
+
+        while stack and len(paths) < self.k:
+
+            node, path = stack.pop()
+
+            if node == dst:
+
+                paths.append(path)
+
+                continue
+
+            step = ds[node] + 1
+
+            left = dd[node] - 1
+
+            for nbr in sorted(self.adj[node], reverse=True):
+
+                if ds.get(nbr) == step and dd.get(nbr) == left:
+
+                    stack.append((nbr, path + (nbr,)))
+
+        return paths
+
+    #合并变化表，保留最早的旧出端口表
+    @staticmethod
+    def _merge(changed, more):
+
+        for pair, hops in more.items():
+
+            changed.setdefault(pair, hops)
+
+    def _drop_pair(self, s, d):
+
+        if s > d:
+
+            s, d = d, s
+
+        for link in self.pair_links.pop((s, d), ()):
+
+            pairs = self.link_index.get(link)
+
+            if pairs is not None:
+
+                pairs.discard((s, d))
+
+                if not pairs:
+
+                    del self.link_index[link]
+
+        for pair in ((s, d), (d, s)):
+
+            self.routes.pop(pair, None)
+
+            self.hops.pop(pair, None)
+
+    #重新计算一对交换机（双向）的路径，返回出端口发生变化的对及其旧的出端口表
+    def _compute_pair(self, s, d):
+
+        if s > d:
+
+            s, d = d, s
+
+        old = {(s, d): self.hops.get((s, d)), (d, s): self.hops.get((d, s))}
+
+        self._drop_pair(s, d)
+
+        paths = self._k_paths(s, d)
+
+        if paths:
+
+            links = set()
+
+            forward = {}
+
+            backward = {}
+
+            for path in paths:
+
+                for u, v in zip(path, path[1:]):
+
+                    forward.setdefault(u, set()).add(self.adj[u][v])
+
+                    backward.setdefault(v, set()).add(self.adj[v][u])
+
+                    links.add(self._link_key(u, v))
+
+            self.routes[(s, d)] = tuple(paths)
+
+            self.routes[(d, s)] = tuple(tuple(reversed(p)) for p in paths)
+
+            self.hops[(s, d)] = dict((n, tuple(sorted(p)))
+                                     for n, p in forward.items())
+
+            self.hops[(d, s)] = dict((n, tuple(sorted(p)))
+                                     for n, p in backward.items())
+
+            self.pair_links[(s, d)] = links
+
+            for link in links:
+
+                self.link_index.setdefault(link, set()).add((s, d))
+
+        return dict((pair, hops) for pair, hops in old.items()
+                    if self.hops.get(pair) != hops)
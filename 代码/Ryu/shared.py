@@ -0,0 +1,237 @@
+#多控制器分片：交换机按dpid确定性地分配给各控制器实例，实例之间通过同一台机器上的SQLite数据库共享状态
+#共享的内容有主机位置、各实例通过LLDP发现的链路、实例心跳以及角色请求用的generation_id
+#数据库使用WAL日志模式，多个进程可以同时读，写入不阻塞读取
+#packet-in路径上不访问数据库：主机发布先放进内存，由同步线程flush时一次写入；查询走同步线程pull时刷新的内存缓存
+
+import sqlite3
+import time
+from collections import OrderedDict
+
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS hosts (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    mac TEXT UNIQUE, ip TEXT, dpid INTEGER, port INTEGER, shard INTEGER);
+CREATE INDEX IF NOT EXISTS hosts_ip ON hosts (ip);
+CREATE TABLE IF NOT EXISTS links (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    src INTEGER, src_port INTEGER, dst INTEGER, dst_port INTEGER,
+    alive INTEGER, shard INTEGER, UNIQUE (src, src_port, dst, dst_port));
+CREATE TABLE IF NOT EXISTS shards (
+    shard INTEGER PRIMARY KEY, seen REAL);
+CREATE TABLE IF NOT EXISTS generation (
+    id INTEGER PRIMARY KEY, value INTEGER);
+'''
+
+
+#交换机所属的实例：按dpid取模，该实例失效时顺延给下一个存活的实例，所有实例算出的结果一致
+def shard_of(dpid, count, alive=None):
+
+    shard = dpid % count
+
+    if not alive:
+
+        return shard
+
+    for i in range(count):
+
+        candidate = (shard + i) % count
+
+        if candidate in alive:
+
+            return candidate
+
+    return shard
+
+
+class SharedState(object):
+
+    def __init__(self, path, shard, timeout=5.0, max_hosts=100000):
+
+        self.shard = shard
+
+        #超过timeout秒没有心跳的实例视为失效
+        self.timeout = timeout
+
+        #自动提交模式，每条语句各自是一个事务
+        self.conn = sqlite3.connect(path, timeout=timeout,
+                                    isolation_level=None)
+
+        self.conn.execute('PRAGMA journal_mode=WAL')
+
+        self.conn.execute('PRAGMA synchronous=NORMAL')
+
+        self.conn.executescript(SCHEMA)
+
+        #已经读取过的最大序号，pull只返回之后写入的变化
+        self.host_seq = 0
+
+        self.link_seq = 0
+
+        #等待flush写入的主机：mac -> (mac, ip, dpid, port, shard)，同一主机只保留最后一次
+        self.outbox = OrderedDict()
+
+        #pull读到的主机位置缓存：mac -> (mac, dpid, port, ip)，ip -> 同一元组，按最近更新排序，有上限
+        self.max_hosts = max_hosts
+
+        self.host_cache = OrderedDict()
+
+        self.ip_cache = OrderedDict()
+
+    #心跳，返回当前存活的实例集合
+    def beat(self):
+
+        now = time.time()
+
+        self.conn.execute('INSERT OR REPLACE INTO shards VALUES (?, ?)',
+                          (self.shard, now))
+
+        rows = self.conn.execute('SELECT shard FROM shards WHERE seen > ?',
+                                 (now - self.timeout,))
+
+        return set(row[0] for row in rows)
+
+    #角色请求的generation_id必须单调递增，由所有实例共用一个计数器分配
+    def next_generation(self):
+
+        conn = self.conn
+
+        conn.execute('BEGIN IMMEDIATE')
+
+        try:
+
+            conn.execute('INSERT OR IGNORE INTO generation VALUES (0, 0)')
+
+            conn.execute('UPDATE generation SET value = value + 1')
+
+            value = conn.execute('SELECT value FROM generation').fetchone()[0]
+
+            conn.execute('COMMIT')
+
+        except Exception:
+
+            conn.execute('ROLLBACK')
+
+            raise
+
+        return value
+
+    #发布本实例学习到的主机位置，后写入的覆盖先写入的；只记在内存里，flush时写入数据库
+    def publish_host(self, mac, dpid, port, ip=None):
+
+        self.outbox.pop(mac, None)
+
+        self.outbox[mac] = (mac, ip, dpid, port, self.shard)
+
+    #把攒下的主机发布在一个事务里写入，由同步线程周期调用
+    def flush(self):
+
+        if not self.outbox:
+
+            return
+
+        conn = self.conn
+
+        conn.execute('BEGIN IMMEDIATE')
+
+        try:
+
+            conn.executemany('INSERT OR REPLACE INTO hosts '
+                             '(mac, ip, dpid, port, shard) '
+                             'VALUES (?, ?, ?, ?, ?)', self.outbox.values())
+
+            conn.execute('COMMIT')
+
+            #写入失败时留在outbox里，下次再写
+            self.outbox = OrderedDict()
+
+        except Exception:
+
+            conn.execute('ROLLBACK')
+
+            raise
+
+    #本地查不到主机时按mac或ip查询共享表的内存缓存，返回 (mac, dpid, port, ip)
+    def lookup_host(self, mac=None, ip=None):
+
+        if mac is not None:
+
+            return self.host_cache.get(mac)
+
+        return self.ip_cache.get(ip)
+
+    def _cache_host(self, row):
+
+        mac, ip = row[0], row[3]
+
+        old = self.host_cache.pop(mac, None)
+
+        if old is not None and old[3] and self.ip_cache.get(old[3]) is old:
+
+            del self.ip_cache[old[3]]
+
+        self.host_cache[mac] = row
+
+        if ip:
+
+            self.ip_cache.pop(ip, None)
+
+            self.ip_cache[ip] = row
+
+        while len(self.host_cache) > self.max_hosts:
+
+            mac, old = self.host_cache.popitem(last=False)
+
+            if old[3] and self.ip_cache.get(old[3]) is old:
+
+                del self.ip_cache[old[3]]
+
+        while len(self.ip_cache) > self.max_hosts:
+
+            self.ip_cache.popitem(last=False)
+
+    #发布链路的增加/删除，删除也作为一次写入保留下来，让其它实例能读到
+    def publish_link(self, src, src_port, dst, dst_port, alive=True):
+
+        self.conn.execute('INSERT OR REPLACE INTO links '
+                          '(src, src_port, dst, dst_port, alive, shard) '
+                          'VALUES (?, ?, ?, ?, ?, ?)',
+                          (src, src_port, dst, dst_port, int(alive),
+                           self.shard))
+
+    #读取上次pull之后写入的主机与链路：
+    #([(mac, dpid, port, ip)], [(src, src_port, dst, dst_port, alive)])
+    def pull(self):
+
+        hosts = self.conn.execute('SELECT seq, mac, dpid, port, ip FROM hosts '
+                                  'WHERE seq > ? ORDER BY seq',
+                                  (self.host_seq,)).fetchall()
+
+        links = self.conn.execute('SELECT seq, src, src_port, dst, dst_port, '
+                                  'alive FROM links WHERE seq > ? '
+                                  'ORDER BY seq', (self.link_seq,)).fetchall()
+
+        if hosts:
+
+            self.host_seq = hosts[-1][0]
+
+        if links:
+
+            self.link_seq = links[-1][0]
+
+        #也包括本实例自己写入的，按序号重放后与数据库中的最新状态一致
+        hosts = [tuple(row[1:]) for row in hosts]
+
+        for host in hosts:
+
+            self._cache_host(host)
+
+        links = [tuple(row[1:]) for row in links]
+
+        return hosts, links
+
+    def close(self):
+
+        self.flush()
+
+        self.conn.close()
@@ -0,0 +1,138 @@
+#控制器状态快照：定期把mac学习表、主机位置、交换机间链路、广播组表出端口、各交换机的组表、已下发的流表以及按路由下发的主机对
+#写入本地SQLite文件；重启后读回，交换机重连时与交换机上现有的组表/流表对账，只补下发缺失的部分，不必重新泛洪学习
+
+import json
+import sqlite3
+import time
+
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value REAL);
+CREATE TABLE IF NOT EXISTS macs (dpid INTEGER, mac TEXT, port INTEGER);
+CREATE TABLE IF NOT EXISTS hosts (mac TEXT, dpid INTEGER, port INTEGER,
+                                  ips TEXT);
+CREATE TABLE IF NOT EXISTS groups (dpid INTEGER, group_id INTEGER,
+                                   ports TEXT, weights TEXT);
+CREATE TABLE IF NOT EXISTS flows (dpid INTEGER, mod TEXT);
+CREATE TABLE IF NOT EXISTS pairs (src INTEGER, dst INTEGER, src_mac TEXT,
+                                  dst_mac TEXT, eth_type INTEGER);
+CREATE TABLE IF NOT EXISTS links (src INTEGER, src_port INTEGER,
+                                  dst INTEGER, dst_port INTEGER);
+CREATE TABLE IF NOT EXISTS flood (dpid INTEGER, ports TEXT);
+'''
+
+#表结构变化时加一，旧版本的快照直接丢弃
+SCHEMA_VERSION = 3
+
+TABLES = ('macs', 'hosts', 'groups', 'flows', 'pairs', 'links', 'flood')
+
+
+class Snapshot(object):
+
+    def __init__(self, path):
+
+        self.conn = sqlite3.connect(path, isolation_level=None)
+
+        self.conn.execute('PRAGMA journal_mode=WAL')
+
+        version = self.conn.execute('PRAGMA user_version').fetchone()[0]
+
+        if version != SCHEMA_VERSION:
+
+            for table in TABLES + ('meta',):
+
+                self.conn.execute('DROP TABLE IF EXISTS %s' % table)
+
+            self.conn.execute('PRAGMA user_version = %d' % SCHEMA_VERSION)
+
+        self.conn.executescript(SCHEMA)
+
+    #整体替换快照，在一个事务里完成，进程中途退出时保留上一份完整的快照
+    #macs: [(dpid, mac, port)]，hosts: [(mac, dpid, port, [ip])]，
+    #groups: [(dpid, group_id, 端口元组, 权重元组)]，flows: [(dpid, FlowMod的jsondict)]，
+    #pairs: [(源交换机, 目的交换机, 源mac, 目的mac, 以太网类型)]，
+    #links: [(交换机, 端口, 交换机, 端口)]，flood: [(dpid, 广播组表出端口元组)]
+    def save(self, macs, hosts, groups, flows, pairs, links, flood):
+
+        conn = self.conn
+
+        conn.execute('BEGIN IMMEDIATE')
+
+        try:
+
+            for table in TABLES:
+
+                conn.execute('DELETE FROM %s' % table)
+
+            conn.executemany('INSERT INTO macs VALUES (?, ?, ?)', macs)
+
+            conn.executemany('INSERT INTO hosts VALUES (?, ?, ?, ?)',
+                             [(mac, dpid, port, ','.join(ips))
+                              for mac, dpid, port, ips in hosts])
+
+            conn.executemany('INSERT INTO groups VALUES (?, ?, ?, ?)',
+                             [(dpid, group_id, json.dumps(list(ports)),
+                               json.dumps(list(weights or ())))
+                              for dpid, group_id, ports, weights in groups])
+
+            conn.executemany('INSERT INTO flows VALUES (?, ?)',
+                             [(dpid, json.dumps(mod)) for dpid, mod in flows])
+
+            conn.executemany('INSERT INTO pairs VALUES (?, ?, ?, ?, ?)', pairs)
+
+            conn.executemany('INSERT INTO links VALUES (?, ?, ?, ?)', links)
+
+            conn.executemany('INSERT INTO flood VALUES (?, ?)',
+                             [(dpid, json.dumps(list(ports)))
+                              for dpid, ports in flood])
+
+            conn.execute('INSERT OR REPLACE INTO meta VALUES (?, ?)',
+                          ('saved', time.time()))
+
+            conn.execute('COMMIT')
+
+        except Exception:
+
+            conn.execute('ROLLBACK')
+
+            raise
+
+    #读回快照，格式与save的参数相同，另有保存时间saved；没有快照时返回None
+    def load(self):
+
+        conn = self.conn
+
+        row = conn.execute("SELECT value FROM meta WHERE key = 'saved'").fetchone()
+
+        if row is None:
+
+            return None
+
+        state = {'saved': row[0]}
+
+        state['macs'] = conn.execute('SELECT dpid, mac, port FROM macs').fetchall()
+
+        state['hosts'] = [(mac, dpid, port, ips.split(',') if ips else [])
+                          for mac, dpid, port, ips in
+                          conn.execute('SELECT * FROM hosts')]
+
+        state['groups'] = [(dpid, group_id, tuple(json.loads(ports)),
+                            tuple(json.loads(weights)) or None)
+                           for dpid, group_id, ports, weights in
+                           conn.execute('SELECT * FROM groups')]
+
+        state['flows'] = [(dpid, json.loads(mod)) for dpid, mod in
+                          conn.execute('SELECT * FROM flows')]
+
+        state['pairs'] = conn.execute('SELECT * FROM pairs').fetchall()
+
+        state['links'] = conn.execute('SELECT * FROM links').fetchall()
+
+        state['flood'] = [(dpid, tuple(json.loads(ports))) for dpid, ports in
+                          conn.execute('SELECT * FROM flood')]
+
+        return state
+
+    def close(self):
+
+        self.conn.close()